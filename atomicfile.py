@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Atomic replacement of files
+
+author: Rinse Wester
+
+"""
+
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+
+@contextmanager
+def openAtomic(filename, mode='w', buffering=-1, encoding=None):
+    """
+    Opens a temporary file next to filename which replaces filename when the
+    with block finishes without an exception.
+
+    Readers of filename therefore see either the old or the complete new
+    contents, also when writing fails halfway. The permissions of an existing
+    file are kept. buffering and encoding are passed on to open().
+    """
+    tmpname = '{}.{}.tmp'.format(filename, uuid.uuid4().hex[:8])
+    f = open(tmpname, mode.replace('w', 'x'), buffering=buffering, encoding=encoding)
+    try:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmpname)
+        os.replace(tmpname, filename)
+    except BaseException:
+        f.close()
+        os.remove(tmpname)
+        raise
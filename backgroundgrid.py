@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Background grid of the scenes
+
+Only the part of the grid in the exposed rect is drawn. At the usual zoom
+levels this is done by tiling a small cached pixmap of the grid, otherwise
+all visible lines are drawn with one drawLines() call. When zoomed out the
+grid is thinned to every 2nd, 4th, ... line so the lines stay apart.
+
+author: Rinse Wester
+
+"""
+
+import math
+
+from PyQt5.QtCore import Qt, QLineF, QPointF, QRectF
+from PyQt5.QtGui import QPainter, QPen
+from PyQt5.QtWidgets import QStyleOptionGraphicsItem
+
+import schemastyle
+from rendercache import renderCache, scaleBucket
+
+# Minimal distance between grid lines on the screen in pixels
+GRID_MIN_SPACING = 6
+
+# Minimal size of a pixmap tile of the grid in pixels
+GRID_TILE_SIZE = 256
+
+# Nr of lines by which the range of directly drawn lines is rounded
+GRID_LINE_BLOCK = 32
+
+
+class BackgroundGrid(object):
+    """
+    Draws a grid of lines at multiples of xRes and yRes.
+
+    Parameters
+    ----------
+    xRes : distance between the vertical lines in scene coordinates
+    yRes : distance between the horizontal lines in scene coordinates
+    """
+
+    def __init__(self, xRes=schemastyle.GRID_X_RES, yRes=schemastyle.GRID_Y_RES):
+        self.xRes = xRes
+        self.yRes = yRes
+        # Lines of the last direct draw, reused while the exposed grid lines
+        # are the same
+        self.linesKey = None
+        self.lines = []
+
+    def draw(self, painter, rect):
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        xStep = self.spacing(self.xRes, lod)
+        yStep = self.spacing(self.yRes, lod)
+        # Tiles only line up with the scene when drawn at the scale they were
+        # rendered for, scaling them down would also drop lines
+        scale = scaleBucket(lod)
+        if renderCache.enabled and scale is not None and abs(scale - lod) < 1e-9:
+            self.drawTiled(painter, rect, xStep, yStep, scale)
+        else:
+            self.drawLines(painter, rect, xStep, yStep)
+
+    def spacing(self, res, lod):
+        # Thin out the lines until they are at least GRID_MIN_SPACING apart
+        step = res
+        while step * lod < GRID_MIN_SPACING:
+            step *= 2
+        return step
+
+    def drawLines(self, painter, rect, xStep, yStep):
+        # The range of lines is rounded to whole blocks, so the same lines
+        # are drawn while scrolling a bit
+        left = math.floor(rect.left() / xStep / GRID_LINE_BLOCK) * GRID_LINE_BLOCK
+        right = math.ceil(rect.right() / xStep / GRID_LINE_BLOCK) * GRID_LINE_BLOCK
+        top = math.floor(rect.top() / yStep / GRID_LINE_BLOCK) * GRID_LINE_BLOCK
+        bottom = math.ceil(rect.bottom() / yStep / GRID_LINE_BLOCK) * GRID_LINE_BLOCK
+        key = (xStep, yStep, left, right, top, bottom)
+        if key != self.linesKey:
+            y0, y1 = top * yStep, bottom * yStep
+            x0, x1 = left * xStep, right * xStep
+            self.lines = [QLineF(i * xStep, y0, i * xStep, y1) for i in range(left, right + 1)]
+            self.lines.extend(QLineF(x0, i * yStep, x1, i * yStep) for i in range(top, bottom + 1))
+            self.linesKey = key
+        painter.save()
+        painter.setClipRect(rect, Qt.IntersectClip)
+        painter.setPen(self.pen())
+        painter.drawLines(self.lines)
+        painter.restore()
+
+    def drawTiled(self, painter, rect, xStep, yStep, scale):
+        # A tile holds an even nr of cells, so its size in pixels is a whole
+        # number for every scale bucket and the tiles line up
+        nx = 2 * math.ceil(GRID_TILE_SIZE / (2 * xStep * scale))
+        ny = 2 * math.ceil(GRID_TILE_SIZE / (2 * yStep * scale))
+        tileRect = QRectF(0, 0, nx * xStep, ny * yStep)
+
+        def render(p):
+            p.setRenderHint(QPainter.Antialiasing, False)
+            p.setPen(self.pen())
+            p.drawLines([QLineF(i * xStep, 0, i * xStep, tileRect.height()) for i in range(nx)] +
+                [QLineF(0, i * yStep, tileRect.width(), i * yStep) for i in range(ny)])
+
+        key = ('grid', xStep, yStep, nx, ny, schemastyle.GRID_COLOR.rgba())
+        pm = renderCache.pixmap(key, tileRect, scale, render)
+
+        # Tile in pixmap pixels, with the origin of the grid at the origin of
+        # the pixmap
+        painter.save()
+        painter.scale(1 / scale, 1 / scale)
+        target = QRectF(rect.x() * scale, rect.y() * scale, rect.width() * scale, rect.height() * scale)
+        offset = QPointF(target.x() % pm.width(), target.y() % pm.height())
+        painter.drawTiledPixmap(target, pm, offset)
+        painter.restore()
+
+    def pen(self):
+        pen = QPen(schemastyle.GRID_COLOR)
+        pen.setCosmetic(True)
+        return pen
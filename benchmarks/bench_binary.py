@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: load time and peak RSS of JSON versus binary schematic files
+
+Every load runs in a fresh interpreter so the peak RSS of one measurement does
+not leak into the next.
+
+usage: python3 benchmarks/bench_binary.py [nr of components ...]
+
+author: Rinse Wester
+
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import synth
+from schematic import Schematic
+import schematicbin
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def child(fmt, filename):
+    # Measure a single load inside this (fresh) process
+    start = time.perf_counter()
+    schem = Schematic()
+    if fmt == 'json':
+        schem.loadFromFile(filename)
+    else:
+        schem.loadFromBinaryFile(filename)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024
+    print(elapsed, maxrss)
+
+
+def measure(fmt, filename):
+    out = subprocess.run([sys.executable, __file__, '--child', fmt, filename],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    elapsed, maxrss = out.split()[-2:]
+    return float(elapsed), int(maxrss)
+
+
+def main(sizes):
+    print('{:>6}  {:>6}  {:>10}  {:>10}  {:>10}'.format('size', 'format', 'file MiB', 'load s', 'RSS MiB'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            jsonfile = os.path.join(tmpdir, 'synth.json')
+            binfile = os.path.join(tmpdir, 'synth.schb')
+            synth.writeSyntheticJSON(jsonfile, n)
+            schematicbin.jsonToBinary(jsonfile, binfile)
+
+            for fmt, filename in [('json', jsonfile), ('binary', binfile)]:
+                elapsed, maxrss = measure(fmt, filename)
+                print('{:>6}  {:>6}  {:>10.1f}  {:>10.3f}  {:>10.1f}'.format(synth.sizeName(n), fmt,
+                    os.path.getsize(filename) / 2**20, elapsed, maxrss / 1024))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: load time of compressed versus uncompressed schematic files
+
+Files are loaded with a cold page cache (the file is dropped from the cache
+with posix_fadvise, Linux only) and with a warm page cache (the file was read
+just before). On network storage the difference in file size dominates the
+cold numbers even more than on a local disk.
+
+usage: python3 benchmarks/bench_compression.py [nr of components]
+
+author: Rinse Wester
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import synth
+from schematic import Schematic
+import schemacodec
+
+DEFAULT_SIZE = 100000
+REPEATS = 3
+
+
+def dropFromPageCache(filename):
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def timeLoad(filename):
+    start = time.perf_counter()
+    Schematic().loadFromFile(filename)
+    return time.perf_counter() - start
+
+
+def main(n):
+    print('{:>8}  {:>10}  {:>10}  {:>10}'.format('codec', 'file MiB', 'cold s', 'warm s'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, 'synth.json')
+        synth.writeSyntheticJSON(source, n)
+        schem = Schematic()
+        schem.loadFromFile(source)
+
+        for codec in [schemacodec.PLAIN] + list(schemacodec.codecs.values()):
+            filename = os.path.join(tmpdir, 'synth.json' + (codec.extensions[0] if codec.extensions else ''))
+            schem.storeToFile(filename, codec=codec.name)
+
+            cold = []
+            for _ in range(REPEATS):
+                if not dropFromPageCache(filename):
+                    break
+                cold.append(timeLoad(filename))
+            warm = [timeLoad(filename) for _ in range(REPEATS)]
+
+            print('{:>8}  {:>10.2f}  {:>10}  {:>10.3f}'.format(codec.name, os.path.getsize(filename) / 2**20,
+                '{:.3f}'.format(min(cold)) if cold else 'n/a', min(warm)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE)
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: repaints caused by sweeping the mouse across a dense schematic
+
+The mouse is moved over every row of components in small steps, with sockets
+painted by the components and with a SocketGI item per socket. Items should
+only be repainted when the part of them under the mouse changes, so there
+are far fewer hover repaints than mouse moves.
+
+usage: QT_QPA_PLATFORM=offscreen python3 benchmarks/bench_hover.py [nr of components]
+
+author: Rinse Wester
+
+"""
+
+import sys
+import time
+
+import synth
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QPoint
+from PyQt5.QtTest import QTest
+
+from schematic import Schematic
+from schemaview import SchemaScene, SchemaView
+from hovertracker import HOVER_REPAINTS
+import componentgi
+import instrumentation
+
+DEFAULT_SIZE = 400
+VIEWPORT_WIDTH = 1920
+VIEWPORT_HEIGHT = 1080
+MOUSE_STEP = 4
+ROW_STEP = 20
+
+
+def sweep(view):
+    # Move the mouse over the viewport row by row, returns the nr of moves
+    moves = 0
+    for y in range(0, VIEWPORT_HEIGHT, ROW_STEP):
+        for x in range(0, VIEWPORT_WIDTH, MOUSE_STEP):
+            QTest.mouseMove(view.viewport(), QPoint(x, y))
+            moves += 1
+    return moves
+
+
+def main(n):
+    app = QApplication(sys.argv)
+
+    comps = [('c{}'.format(i), ['in_a', 'in_b'], ['out_a', 'out_b'], [(i % 20) * 200, (i // 20) * 100]) for i in range(n)]
+    links = [('c{}'.format(i), 'c{}'.format(i + 1), 'out_a', 'in_a') for i in range(n - 1)]
+    schem = Schematic.from_records(comps, links)
+
+    print('{} components, {} links'.format(n, n - 1))
+    print('{:>9}  {:>8}  {:>10}  {:>10}  {:>12}'.format('sockets', 'moves', 'moves/s', 'repaints', 'repaints/s'))
+    for mode in ['items', 'flyweight']:
+        componentgi.FLYWEIGHT_SOCKETS = mode == 'flyweight'
+        scene = SchemaScene()
+        for _ in scene.populate(schem, None):
+            pass
+        view = SchemaView()
+        view.setScene(scene)
+        view.resize(VIEWPORT_WIDTH, VIEWPORT_HEIGHT)
+        view.show()
+        view.centerOn(VIEWPORT_WIDTH / 2, VIEWPORT_HEIGHT / 2)
+        app.processEvents()
+
+        instrumentation.reset()
+        start = time.perf_counter()
+        moves = sweep(view)
+        elapsed = time.perf_counter() - start
+        repaints = instrumentation.stat(HOVER_REPAINTS)
+        # Every window of a second records its nr of repaints
+        total = repaints.total + instrumentation.rates[HOVER_REPAINTS].count
+        print('{:>9}  {:>8}  {:>10.0f}  {:>10.0f}  {:>12.0f}'.format(mode, moves, moves / elapsed, total, repaints.mean))
+        view.close()
+        scene.closeJournal()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE)
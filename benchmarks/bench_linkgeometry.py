@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: time to make the shapes of all links of a schematic when loading
+it and after moving all components, one link at a time versus in one batch
+with NumPy
+
+usage: QT_QPA_PLATFORM=offscreen python3 benchmarks/bench_linkgeometry.py [nr of components ...]
+
+author: Rinse Wester
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import synth
+from PyQt5.QtWidgets import QApplication
+
+from schemaview import SchemaScene
+import instrumentation
+import linkgeometry
+
+DEFAULT_SIZES = [1000, 10000]
+REPEATS = 5
+
+
+def timeReshape(scene):
+    # Best of a few reshapes of all links, as after moving all components
+    best = None
+    for _ in range(REPEATS):
+        scene.dirtyLinks.update(scene.links.values())
+        start = time.perf_counter()
+        scene.reshapeLinks()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(sizes):
+    app = QApplication(sys.argv)
+    numpy = linkgeometry.numpy
+    modes = [('each', None)]
+    if numpy is not None:
+        modes.append(('numpy', numpy))
+
+    print('{:>6}  {:>8}  {:>6}  {:>10}  {:>10}'.format('size', 'links', 'mode', 'load s', 'reshape s'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            filename = os.path.join(tmpdir, 'synth.json')
+            synth.writeSyntheticJSON(filename, n)
+
+            for mode, module in modes:
+                linkgeometry.numpy = module
+                instrumentation.reset()
+                scene = SchemaScene()
+                scene.loadFromFile(filename)
+                load = instrumentation.stat('load links s').last
+                print('{:>6}  {:>8}  {:>6}  {:>10.3f}  {:>10.3f}'.format(synth.sizeName(n), len(scene.links),
+                    mode, load, timeReshape(scene)))
+                scene.closeJournal()
+
+    if numpy is None:
+        print('NumPy is not installed, only the links one at a time were measured')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: time to open a schematic in a scene, per phase of the load
+
+The phases are parsing the file, creating the components, creating the links
+and building the index of the scene.
+
+usage: QT_QPA_PLATFORM=offscreen python3 benchmarks/bench_load.py [nr of components ...]
+
+author: Rinse Wester
+
+"""
+
+import os
+import sys
+import tempfile
+
+import synth
+from PyQt5.QtWidgets import QApplication
+
+from schemaview import SchemaScene
+import instrumentation
+
+DEFAULT_SIZES = [1000, 10000]
+PHASES = ['load parse s', 'load components s', 'load links s', 'load index s']
+
+
+def main(sizes):
+    app = QApplication(sys.argv)
+
+    print('{:>6}  {:>10}  {:>10}  {:>10}  {:>10}  {:>10}'.format('size', 'parse s', 'comps s', 'links s', 'index s', 'total s'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            filename = os.path.join(tmpdir, 'synth.json')
+            synth.writeSyntheticJSON(filename, n)
+
+            instrumentation.reset()
+            scene = SchemaScene()
+            scene.loadFromFile(filename)
+            times = [instrumentation.stat(phase).last for phase in PHASES]
+            print('{:>6}  {:>10.3f}  {:>10.3f}  {:>10.3f}  {:>10.3f}  {:>10.3f}'.format(synth.sizeName(n), *times, sum(times)))
+            scene.closeJournal()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: time to paint all items of a scene with and without render cache
+
+The scene is rendered offscreen in viewport sized tiles at a few zoom levels.
+Every number is the best of a few passes. A cold pass starts with an empty
+cache and fills it, a cached pass paints from the filled cache. The gain is
+the time saved by a cached pass compared to painting directly. Beyond
+rendercache.MAX_SCALE all passes paint directly.
+
+usage: QT_QPA_PLATFORM=offscreen python3 benchmarks/bench_paint.py [nr of components]
+
+author: Rinse Wester
+
+"""
+
+import sys
+import time
+
+import synth
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QImage, QPainter
+
+from schematic import Schematic
+from schemaview import SchemaScene
+from rendercache import renderCache
+
+DEFAULT_SIZE = 5000
+VIEWPORT_WIDTH = 1920
+VIEWPORT_HEIGHT = 1080
+ZOOM_LEVELS = [0.1, 0.25, 0.5, 1.0, 2.0, 4.0]
+REPEATS = 3
+
+
+def renderScene(scene, image, lod):
+    # Render the complete scene, one viewport at a time
+    rect = scene.itemsBoundingRect()
+    tileWidth = VIEWPORT_WIDTH / lod
+    tileHeight = VIEWPORT_HEIGHT / lod
+    start = time.perf_counter()
+    y = rect.top()
+    while y < rect.bottom():
+        x = rect.left()
+        while x < rect.right():
+            image.fill(Qt.black)
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.Antialiasing, True)
+            scene.render(painter, QRectF(0, 0, VIEWPORT_WIDTH, VIEWPORT_HEIGHT), QRectF(x, y, tileWidth, tileHeight))
+            painter.end()
+            x += tileWidth
+        y += tileHeight
+    return time.perf_counter() - start
+
+
+def main(n):
+    app = QApplication(sys.argv)
+
+    comps = [('c{}'.format(i), ['in_a', 'in_b'], ['out_a', 'out_b'], [(i % 100) * 200, (i // 100) * 100]) for i in range(n)]
+    links = [('c{}'.format(i), 'c{}'.format(i + 1), 'out_a', 'in_a') for i in range(n - 1)]
+    schem = Schematic.from_records(comps, links)
+    scene = SchemaScene()
+    for _ in scene.populate(schem, None):
+        pass
+
+    image = QImage(VIEWPORT_WIDTH, VIEWPORT_HEIGHT, QImage.Format_ARGB32_Premultiplied)
+    print('{} components, {} links'.format(n, n - 1))
+    print('{:>6}  {:>12}  {:>12}  {:>12}  {:>6}'.format('zoom', 'direct ms', 'cold ms', 'cached ms', 'gain'))
+    for lod in ZOOM_LEVELS:
+        renderCache.enabled = False
+        direct = min(renderScene(scene, image, lod) for _ in range(REPEATS))
+        renderCache.enabled = True
+        cold = []
+        for _ in range(REPEATS):
+            renderCache.clear()
+            cold.append(renderScene(scene, image, lod))
+        cached = min(renderScene(scene, image, lod) for _ in range(REPEATS))
+        print('{:>6}  {:>12.1f}  {:>12.1f}  {:>12.1f}  {:>5.0f}%'.format(lod, direct * 1e3, min(cold) * 1e3,
+            cached * 1e3, (1 - cached / direct) * 100))
+    print('cache: {} entries, {:.1f} MiB'.format(len(renderCache.entries), renderCache.nbytes / (1 << 20)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE)
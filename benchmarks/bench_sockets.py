@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: items in the scene, load time and peak RSS with a SocketGI item
+per socket versus sockets painted by their component
+
+Every load runs in a fresh interpreter so the peak RSS of one measurement does
+not leak into the next.
+
+usage: QT_QPA_PLATFORM=offscreen python3 benchmarks/bench_sockets.py [nr of components ...]
+
+author: Rinse Wester
+
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import synth
+
+DEFAULT_SIZES = [1000, 10000]
+
+
+def child(mode, filename):
+    # Measure a single load inside this (fresh) process
+    from PyQt5.QtWidgets import QApplication
+    import componentgi
+    from schemaview import SchemaScene
+
+    app = QApplication(sys.argv)
+    componentgi.FLYWEIGHT_SOCKETS = mode == 'flyweight'
+    start = time.perf_counter()
+    scene = SchemaScene()
+    scene.loadFromFile(filename)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024
+    print(len(scene.items()), elapsed, maxrss)
+    scene.closeJournal()
+
+
+def measure(mode, filename):
+    out = subprocess.run([sys.executable, __file__, '--child', mode, filename],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    items, elapsed, maxrss = out.split()[-3:]
+    return int(items), float(elapsed), int(maxrss)
+
+
+def main(sizes):
+    print('{:>6}  {:>9}  {:>10}  {:>10}  {:>10}'.format('size', 'sockets', 'items', 'load s', 'RSS MiB'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            filename = os.path.join(tmpdir, 'synth.json')
+            synth.writeSyntheticJSON(filename, n)
+
+            for mode in ['items', 'flyweight']:
+                items, elapsed, maxrss = measure(mode, filename)
+                print('{:>6}  {:>9}  {:>10}  {:>10.3f}  {:>10.1f}'.format(synth.sizeName(n), mode,
+                    items, elapsed, maxrss / 1024))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
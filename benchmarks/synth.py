@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Generator for large synthetic schematics used by the benchmarks
+
+author: Rinse Wester
+
+"""
+
+import os
+import sys
+
+# The benchmarks live next to the modules they measure
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+COLUMNS = 100
+
+
+def writeSyntheticJSON(filename, ncomponents):
+    """
+    Writes a schematic with ncomponents 2x2 components placed on a grid.
+
+    Every component drives the next one through its out_a socket, so the file
+    contains ncomponents - 1 links. The layout of the file is identical to the
+    one written by Schematic.storeToFile.
+    """
+    with open(filename, 'w') as f:
+        f.write('{\n    "components": [')
+        for i in range(ncomponents):
+            x = (i % COLUMNS) * 250.0
+            y = (i // COLUMNS) * 100.0
+            f.write(',' if i > 0 else '')
+            f.write('\n        {\n            "name": "C' + str(i) + '",\n')
+            f.write('            "pos": [\n                ' + repr(x) + ',\n                ' + repr(y) + '\n            ],\n')
+            f.write('            "leftsockets": [\n                "in_a",\n                "in_b"\n            ],\n')
+            f.write('            "rightsockets": [\n                "out_a",\n                "out_b"\n            ]\n        }')
+        f.write('\n    ],\n    "links": [')
+        for i in range(ncomponents - 1):
+            f.write(',' if i > 0 else '')
+            f.write('\n        {\n            "src": "C' + str(i) + '.out_a",\n')
+            f.write('            "dst": "C' + str(i + 1) + '.in_a"\n        }')
+        f.write('\n    ]\n}')
+
+
+def sizeName(n):
+    if n >= 1000000 and n % 1000000 == 0:
+        return str(n // 1000000) + 'M'
+    if n >= 1000 and n % 1000 == 0:
+        return str(n // 1000) + 'k'
+    return str(n)
@@ -9,32 +9,60 @@ author: Rinse Wester
 """
 
 import sys
+import math
 from PyQt5.QtWidgets import QWidget, QGraphicsItem, QPushButton, QVBoxLayout, QMenu, QAction, QInputDialog, QMessageBox
 from PyQt5.QtCore import QRectF, QRect, QPointF, QPoint, Qt, QVariant
 from PyQt5.QtGui import QColor, QPainter, QBrush, QPainterPath, QLinearGradient, QFont, QContextMenuEvent
 from collections import Counter, OrderedDict
-from socketgi import SocketGI
+from socketgi import SocketGI, Socket, SOCKET_WIDTH, SOCKET_HEIGHT, onConnectionPoint, paintSocket
 import schemastyle
+from rendercache import renderCache
+from hovertracker import HoverTracker
+
+# Paint the sockets from the component instead of having a SocketGI child
+# item for every socket
+FLYWEIGHT_SOCKETS = True
 
 class ComponentGI(QGraphicsItem):
 
-    def __init__(self, name, leftSockets=[], rightSockets=[]):
+    def __init__(self, name, leftSockets=[], rightSockets=[], flyweight=None):
         super().__init__()
         
         self.compWidth = 150
         self.compHeight = max(len(leftSockets), len(rightSockets)) * 20 + 20# 50
+        self.compBRect = QRectF(-self.compWidth // 2, -self.compHeight // 2, self.compWidth, self.compHeight)
         self.snappingIsOn = True
 
         self.setFlag(QGraphicsItem.ItemIsSelectable, True)
         self.setFlag(QGraphicsItem.ItemIsMovable, True)
         self.setFlag(QGraphicsItem.ItemSendsGeometryChanges, True)
         self.setAcceptHoverEvents(True)
-        self.hovering = False
+        # Hovering over the component or not and the flyweight socket of which
+        # the connection point is hovered. Only that socket has interactive
+        # state.
+        self.hoverState = HoverTracker(self, (False, None), self.repaintHover)
 
         self.compName = name
         self.leftSocketGItems = OrderedDict()
         self.rightSocketGItems = OrderedDict()
 
+        self.flyweight = FLYWEIGHT_SOCKETS if flyweight is None else flyweight
+        if self.flyweight:
+            # The sockets of a side as a list in the order they are drawn
+            self.leftSocketRows = []
+            self.rightSocketRows = []
+            hoffs = -(len(leftSockets) - 1) * 20 // 2
+            for ind, lsn in enumerate(leftSockets):
+                sock = Socket(lsn, SocketGI.LEFT, self, -self.compWidth // 2, hoffs + ind * 20)
+                self.leftSocketGItems[lsn] = sock
+                self.leftSocketRows.append(sock)
+            hoffs = -(len(rightSockets) - 1) * 20 // 2
+            for ind, rsn in enumerate(rightSockets):
+                sock = Socket(rsn, SocketGI.RIGHT, self, self.compWidth // 2, hoffs + ind * 20)
+                self.rightSocketGItems[rsn] = sock
+                self.rightSocketRows.append(sock)
+            return
+
         # Create sockets for the left side
         for ind, lsn in enumerate(leftSockets):
             lsockGItem = SocketGI(lsn, SocketGI.LEFT, self)
@@ -60,6 +88,14 @@ class ComponentGI(QGraphicsItem):
         self.compName = name
         self.update()
 
+    @property
+    def hovering(self):
+        return self.hoverState.target[0]
+
+    @property
+    def hoverSocket(self):
+        return self.hoverState.target[1]
+
     @property
     def location(self):
         return self.x(), self.y()
@@ -70,11 +106,73 @@ class ComponentGI(QGraphicsItem):
         self.setPos(x, y)
 
     def boundingRect(self):
-        return QRectF(-self.compWidth // 2, -self.compHeight // 2, self.compWidth, self.compHeight)
+        return self.compBRect
     
     def paint(self, painter, option, widget):
         lod = option.levelOfDetailFromTransform(painter.worldTransform())
-        
+        tier = schemastyle.lodTier(lod)
+
+        if tier <= schemastyle.LOD_TIER_MEDIUM:
+            # Draw in high detail using a pixmap of the body shared by all
+            # components that look the same
+            key = ('component', self.compWidth, self.compHeight, self.hovering, self.isSelected())
+            renderCache.paint(painter, key, self.boundingRect(), lod, self.paintBody)
+            painter.setPen(schemastyle.COMPONENT_TEXT_COLOR)
+            renderCache.drawCenteredText(painter, self.compName, self.boundingRect())
+            if self.flyweight:
+                self.paintSockets(painter, lod)
+        elif tier == schemastyle.LOD_TIER_LOW:
+            # Draw in low detail
+            self.setBodyStyle(painter)
+            painter.drawRect(-self.compWidth // 2, -self.compHeight // 2,
+                self.compWidth, self.compHeight)
+        else:
+            # Just a filled cell in the overview
+            if self.isSelected():
+                painter.fillRect(self.boundingRect(), Qt.white)
+            else:
+                painter.fillRect(self.boundingRect(), schemastyle.COMPONENT_OVERVIEW_COLOR)
+
+    def paintSockets(self, painter, lod):
+        for sock in self.leftSocketRows + self.rightSocketRows:
+            painter.translate(sock.x, sock.y)
+            paintSocket(painter, lod, sock.sockLocation, sock.sockName, sock is self.hoverSocket)
+            painter.translate(-sock.x, -sock.y)
+
+    def socketAt(self, pos):
+        # The flyweight socket at pos in component coordinates, or None
+        if pos.x() < -self.compWidth // 2 + SOCKET_WIDTH:
+            rows = self.leftSocketRows
+        elif pos.x() > self.compWidth // 2 - SOCKET_WIDTH:
+            rows = self.rightSocketRows
+        else:
+            return None
+        if not rows:
+            return None
+        # Sockets are SOCKET_HEIGHT apart, centered around the first one
+        row = math.floor((pos.y() - rows[0].y + SOCKET_HEIGHT / 2) / SOCKET_HEIGHT)
+        if 0 <= row < len(rows):
+            return rows[row]
+        return None
+
+    def socketConnectionAt(self, pos):
+        # The flyweight socket of which the connection point is at pos
+        sock = self.socketAt(pos)
+        if sock is not None and onConnectionPoint(sock.sockLocation, pos.x() - sock.x):
+            return sock
+        return None
+
+    def repaintHover(self, old, new):
+        # The body looks different when hovered, otherwise only the sockets
+        # moved onto or off change
+        if old[0] != new[0]:
+            self.update()
+        else:
+            for sock in (old[1], new[1]):
+                if sock is not None:
+                    sock.update()
+
+    def setBodyStyle(self, painter):
         if self.isSelected():
             painter.setPen(Qt.white)
         else:
@@ -84,40 +182,65 @@ class ComponentGI(QGraphicsItem):
         else:
             painter.setBrush(QBrush(schemastyle.COMPONENT_BACKGROUND_COLOR))
 
-        if lod > 0.4:
-            # Draw in high detail
-            painter.drawRoundedRect(-self.compWidth // 2, -self.compHeight // 2,
-                self.compWidth, self.compHeight, 5, 5)
-
-            textrect = QRectF(-self.compWidth // 2, -self.compHeight // 2, self.compWidth, self.compHeight)
-            painter.setPen(schemastyle.COMPONENT_TEXT_COLOR)
-            painter.drawText(textrect, Qt.AlignCenter, self.compName)
-        else:
-            # Draw in low detail
-            painter.drawRect(-self.compWidth // 2, -self.compHeight // 2,
-                self.compWidth, self.compHeight)
+    def paintBody(self, painter):
+        self.setBodyStyle(painter)
+        painter.drawRoundedRect(-self.compWidth // 2, -self.compHeight // 2,
+            self.compWidth, self.compHeight, 5, 5)
 
     def hoverEnterEvent(self, event):
-        self.hovering = True
-        super().hoverEnterEvent(event)
+        self.hoverState.setTarget((True, None))
+        # The tooltip is only made when it can be shown
+        # TODO: add better description in tooltip after <br/>
+        self.setToolTip("<b>{}</b><br/>pos: {}".format(self.name, self.location))
+        # Not calling super(), the hover tracker repaints already
+
+    def hoverMoveEvent(self, event):
+        if self.flyweight:
+            # Only repaints when moving onto or off a connection point
+            sock = self.socketConnectionAt(event.pos())
+            self.hoverState.setTarget((True, sock))
+            self.hoverState.setCursor(Qt.CrossCursor if sock is not None else None)
+        super().hoverMoveEvent(event)
 
     def hoverLeaveEvent(self, event):
-        self.hovering = False
-        super().hoverLeaveEvent(event)
+        self.hoverState.setTarget((False, None))
+        self.hoverState.setCursor(None)
+
+    def mousePressEvent(self, event):
+        if self.flyweight:
+            sock = self.socketConnectionAt(event.pos())
+            if sock is not None and sock.link is None:
+                if self.scene().nowConnecting:
+                    self.scene().finishConnecting(sock)
+                else:
+                    self.scene().startConnecting(sock)
+                event.accept()
+                return
+        super().mousePressEvent(event)
 
     def itemChange(self, change, value):
         newPos = value
         if change == QGraphicsItem.ItemPositionChange:
             newPos = self.snapToGrid(newPos)
-            # update all the links such that the postions of the src/dst matches with the socket
+        elif change == QGraphicsItem.ItemPositionHasChanged:
+            # update all the links such that the postions of the src/dst
+            # matches with the socket, in a scene this is done once per frame
             for sock in self.leftSocketGItems.values():
                 if sock.link is not None:
-                    sock.link.updateShape()
+                    self.linkMoved(sock.link)
             for sock in self.rightSocketGItems.values():
                 if sock.link is not None:
-                    sock.link.updateShape()
+                    self.linkMoved(sock.link)
+            if self.scene() is not None:
+                self.scene().componentMoved(self)
         return super().itemChange(change, newPos)
 
+    def linkMoved(self, link):
+        if self.scene() is not None:
+            self.scene().linkMoved(link)
+        else:
+            link.updateShape()
+
     def snapToGrid(self, position):
         cur_x, cur_y = position.x(), position.y()
         return QPoint(round(cur_x / schemastyle.GRID_X_RES) * schemastyle.GRID_X_RES,
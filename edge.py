@@ -12,10 +12,11 @@ from PyQt5.QtWidgets import QGraphicsItem, QInputDialog, QMessageBox
 from PyQt5.QtCore import Qt, QRectF, QPointF
 from PyQt5.QtGui import QColor, QPen, QBrush, QPainterPath, QFont
 import schemastyle
+import instrumentation
 
 class Edge(QGraphicsItem):
 
-    def __init__(self, beginPoint, endPoint, beginSide, endSide, edgeSelfLoops, pRates, cRates):
+    def __init__(self, beginPoint, endPoint, beginSide, endSide, edgeSelfLoops, pRates, cRates, deferCurve = False):
         super().__init__()
 
         self.edgeSelfLoops = edgeSelfLoops
@@ -24,10 +25,15 @@ class Edge(QGraphicsItem):
         self.endSide = endSide
         self.beginPoint = beginPoint
         self.endPoint = endPoint
-        self.calculateCurvePoints(beginPoint, endPoint)
+        #Paths and bounding rect, built when needed after a change of the edge
+        self.invalidateGeometry()
         self.cRates = cRates
         self.pRates = pRates
-        self.updatePCRects()
+        #When placing a graph, the curves of all edges are calculated at once
+        #later on, see linkgeometry.updateEdgeCurves()
+        if not deferCurve:
+            self.calculateCurvePoints(beginPoint, endPoint)
+            self.updatePCRects()
         
         self.calculateEdgeColors(schemastyle.LINK_BLUE_COLOR)
 
@@ -38,25 +44,34 @@ class Edge(QGraphicsItem):
 
     def boundingRect(self):
         #Used for collision detection and repaint
-        path = self.getEdgePath()
-        path.setFillRule(Qt.WindingFill)
-        path.addRect(self.cRect)
-        path.addRect(self.pRect)
-        path.addPath(self.getLargerEdgePath())
-
-        return path.boundingRect()
+        if self.bRect is None:
+            self.buildGeometry()
+        return self.bRect
     
     def shape(self):
         #Determines the collision area
-        path = self.getEdgePath()
-        path.setFillRule(Qt.WindingFill)
-        
-        path.addRect(self.cRect)
-        path.addRect(self.pRect)
+        if self.shapePath is None:
+            self.buildGeometry()
+        return self.shapePath
 
-        path.addPath(self.getLargerEdgePath())
+    def buildGeometry(self):
+        self.edgePath = self.getEdgePath()
 
-        return path
+        self.shapePath = QPainterPath(self.edgePath)
+        self.shapePath.setFillRule(Qt.WindingFill)
+        self.shapePath.addRect(self.cRect)
+        self.shapePath.addRect(self.pRect)
+        self.shapePath.addPath(self.getLargerEdgePath())
+
+        self.bRect = self.shapePath.boundingRect()
+        instrumentation.record('edge path builds')
+
+    def invalidateGeometry(self):
+        #Called after every change of the points or rects of the edge
+        self.edgePath = None
+        self.paintPath = None
+        self.shapePath = None
+        self.bRect = None
 
     def paint(self, painter, option, widget):
         lod = option.levelOfDetailFromTransform(painter.worldTransform())
@@ -84,10 +99,12 @@ class Edge(QGraphicsItem):
         painter.setPen(pen)
         painter.setBrush(brush)
 
-        edgePath = self.getEdgePath()       
-        edgePath = edgePath.simplified()
+        if self.paintPath is None:
+            if self.edgePath is None:
+                self.buildGeometry()
+            self.paintPath = self.edgePath.simplified()
 
-        painter.drawPath(edgePath)
+        painter.drawPath(self.paintPath)
 
     def getEdgePath(self):
         yTranslation = 2
@@ -291,6 +308,17 @@ class Edge(QGraphicsItem):
         #Add curvePoints
         self.curvePoint1 = QPointF(xPoint1, self.beginPoint.y() + self.yTranslation)
         self.curvePoint2 = QPointF(xPoint2, self.endPoint.y() + self.yTranslation)
+        self.invalidateGeometry()
+
+    def setCurvePoints(self, endX, endY, xPoint1, yPoint1, xPoint2, yPoint2):
+        #Set the curve as calculated by calculateCurvePoints, which may have
+        #moved the endPoint a bit
+        if endX != self.endPoint.x() or endY != self.endPoint.y():
+            self.endPoint = QPointF(endX, endY)
+        self.midPoint = QPointF((self.beginPoint.x() + endX) / 2, (self.beginPoint.y() + endY) / 2)
+        self.curvePoint1 = QPointF(xPoint1, yPoint1)
+        self.curvePoint2 = QPointF(xPoint2, yPoint2)
+        self.invalidateGeometry()
 
     def hoverEnterEvent(self, event):
         self.hover = True
@@ -307,21 +335,29 @@ class Edge(QGraphicsItem):
         self.update()
 
 
-    def moveEdge(self, delta, edgeSide):
+    def moveEdge(self, delta, edgeSide, update = True):
+        #Without update, the caller updates the curve and calls edgeMoved()
         if edgeSide == 'begin':
             self.beginPoint += delta
         else:
             self.endPoint += delta
 
-        #Update curve
-        self.calculateCurvePoints(self.beginPoint, self.endPoint)
+        if update:
+            #Update curve
+            self.calculateCurvePoints(self.beginPoint, self.endPoint)
+
+            #Update P & C rate rects
+            self.updatePCRects()
+
+            self.edgeMoved()
 
-        #Update P & C rate rects
-        self.updatePCRects()
-       
+    def edgeMoved(self):
         #Prepare the painter for a geometry change, so it repaints correctly
+        self.invalidateGeometry()
         self.prepareGeometryChange()
         self.update()
+        if self.scene() is not None:
+            self.scene().itemMoved(self)
 
     def setZValueEdge(self, zValue):
         self.setZValue(zValue)
@@ -360,6 +396,7 @@ class Edge(QGraphicsItem):
             self.cRect = QRectF(self.endPoint.x() - 20, self.endPoint.y() - 15, 20, 10)
         else:
             self.cRect = QRectF(self.endPoint.x(), self.endPoint.y() - 15, 20, 10)
+        self.invalidateGeometry()
 
     # def setPRatesActiontriggered(self):
     #     pRatesStr = str(self.pRates)
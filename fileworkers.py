@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Worker threads to open and save schematics without blocking the GUI
+
+author: Rinse Wester
+
+"""
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from schemaview import SchemaScene
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class FileWorker(QThread):
+    """
+    Runs work() in a separate thread.
+
+    After the thread finished, exactly one of result, error and cancelled
+    describes the outcome.
+    """
+
+    progressChanged = pyqtSignal(int, int)
+
+    def __init__(self):
+        super().__init__()
+        self.cancelRequested = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self.cancelRequested = True
+
+    def reportProgress(self, done, total):
+        # Used as progress callback of the work, which makes it the place to
+        # stop the work when cancelled
+        if self.cancelRequested:
+            raise OperationCancelled()
+        self.progressChanged.emit(done, total)
+
+    def run(self):
+        try:
+            self.result = self.work()
+        except OperationCancelled:
+            self.cancelled = True
+        except Exception as e:
+            # Any error of a corrupt or unreadable file ends up here, an
+            # exception escaping run() would abort the application
+            self.error = e
+
+    def work(self):
+        raise NotImplementedError
+
+
+class LoadWorker(FileWorker):
+    """
+    Parses a schematic file and builds the Schematic, result is a
+    (schematic, journal) tuple as returned by SchemaScene.loadSchematic().
+    """
+
+    def __init__(self, filename, recover=False, cache=None):
+        super().__init__()
+        self.filename = filename
+        self.recover = recover
+        self.cache = cache
+
+    def work(self):
+        return SchemaScene.loadSchematic(self.filename, self.cache, self.recover, progress=self.reportProgress)
+
+
+class SaveWorker(FileWorker):
+    """
+    Writes a snapshot of a schematic to a file.
+    """
+
+    def __init__(self, schem, filename, compressLevel=None):
+        super().__init__()
+        self.schem = schem
+        self.filename = filename
+        self.compressLevel = compressLevel
+
+    def work(self):
+        self.schem.storeToFile(self.filename, compressLevel=self.compressLevel, progress=self.reportProgress)
@@ -13,6 +13,7 @@ from PyQt5.QtGui import QColor
 from PyQt5.QtCore import Qt
 from node import Node
 from edge import Edge
+from linkgeometry import updateEdgeCurves
 
 class Graph(QWidget):
 
@@ -61,7 +62,17 @@ class Graph(QWidget):
     def addEdgeToNodes(self, beginNodeIndex, endNodeIndex, beginSide, endSide, src = '', dst = '', pRates = [0], cRates = [0], resnr = '', argnr = ''):
         beginNode = self.nodeList[beginNodeIndex]
         endNode = self.nodeList[endNodeIndex]
-        
+
+        edge = self.connectNodes(beginNode, endNode, beginSide, endSide, pRates, cRates, resnr, argnr)
+
+        #Add edge to the scene and list
+        self.scene.addItem(edge)
+        self.edgeList.append(edge)
+
+        return edge
+
+    def connectNodes(self, beginNode, endNode, beginSide, endSide, pRates, cRates, resnr, argnr, update = True):
+        #Returns a new edge between the last free IO of both nodes
         #Get points on the nodes that the edge can connect to
         beginPoint = beginNode.getIOPointForEdge(beginSide, 2)
         endPoint = endNode.getIOPointForEdge(endSide, 1)
@@ -72,16 +83,50 @@ class Graph(QWidget):
         endNode.setIOType(endSide, 1, argnr)
 
         #Add new IO ports to nodes for future edges
-        beginNode.addNewIO(beginSide, 0)
-        endNode.addNewIO(endSide, 0)
+        beginNode.addNewIO(beginSide, 0, update)
+        endNode.addNewIO(endSide, 0, update)
         
-        #Create edge between the 2 nodes
-        edge = self.addEdge(beginPoint, endPoint, beginSide, endSide, beginNode == endNode, src, dst, pRates, cRates)
+        #Create edge between the 2 nodes, always behind nodes. Without
+        #update, the caller also calculates the curve of the edge
+        edge = Edge(beginPoint, endPoint, beginSide, endSide, beginNode == endNode, pRates, cRates, not update)
+        edge.setZValue(1)
 
         #Give both nodes a reference to the created edge
         beginNode.addEdge(edge, 'begin')
         endNode.addEdge(edge, 'end')
 
+        return edge
+
+    def addGraph(self, nodes, edges):
+        #Bulk version of addNode and addEdgeToNodes for a complete graph
+        #nodes: list of (name, x, y)
+        #edges: list of (beginNodeIndex, endNodeIndex, beginSide, endSide, pRates, cRates, resnr, argnr, color)
+        #All items are created and connected before they are added to the
+        #scene, so the scene does not update its index for every change
+        newNodes = []
+        for name, x, y in nodes:
+            newNode = Node(self, self.view, name)
+            newNode.setPos(x, y)
+            newNode.setZValue(0)
+            newNodes.append(newNode)
+
+        newEdges = []
+        for beginNodeIndex, endNodeIndex, beginSide, endSide, pRates, cRates, resnr, argnr, color in edges:
+            edge = self.connectNodes(newNodes[beginNodeIndex], newNodes[endNodeIndex], beginSide, endSide,
+                pRates, cRates, resnr, argnr, False)
+            if color is not None:
+                edge.calculateEdgeColors(color)
+            newEdges.append(edge)
+
+        #The size of a node follows from its nr of IO, update it once
+        for newNode in newNodes:
+            newNode.updateNode()
+        updateEdgeCurves(newEdges)
+
+        for item in newNodes + newEdges:
+            self.scene.addItem(item)
+        self.nodeList.extend(newNodes)
+        self.edgeList.extend(newEdges)
 
     def editNodeFunction(self, name, newFunction):
         self.graphWidget.editNodeFunction(name, newFunction)
@@ -13,6 +13,8 @@ from PyQt5.QtWidgets import QWidget, QGraphicsView, QGraphicsScene, QHBoxLayout,
 from PyQt5.QtCore import Qt, QRectF, QPointF
 from PyQt5.QtGui import QTransform, QPainter, QColor, QPalette
 from graph import Graph
+from spatialindex import BoundsIndex
+from backgroundgrid import BackgroundGrid
 import schemastyle
 
 class GraphicsView(QGraphicsView):
@@ -62,39 +64,63 @@ class GraphicsView(QGraphicsView):
 
 class GraphicsScene(QGraphicsScene):
 
+    # Spacing of the drawn grid, the nodes snap to the finer resolution of
+    # Node.GRID_X_RES by Node.GRID_Y_RES
+    GRID_X_SIZE = 40
+    GRID_Y_SIZE = 20
+
     def __init__(self):
         super().__init__()
 
         self.drawGrid = True
+        self.grid = BackgroundGrid(GraphicsScene.GRID_X_SIZE, GraphicsScene.GRID_Y_SIZE)
         self.lockScene = False
 
+        # Scene rects of all items, updated for the items that were added or
+        # moved since the last change instead of walking all items
+        self.bounds = BoundsIndex()
+        self.movedItems = set()
+
         self.changed.connect(self.updateSceneRect)
 
+    def addItem(self, item):
+        super().addItem(item)
+        self.movedItems.add(item)
+
+    def removeItem(self, item):
+        super().removeItem(item)
+        self.movedItems.discard(item)
+        self.bounds.remove(item)
+
+    def clear(self):
+        super().clear()
+        self.movedItems.clear()
+        self.bounds.clear()
+
+    def itemMoved(self, item):
+        # Called by nodes and edges when their geometry changed
+        self.movedItems.add(item)
+
     def drawBackground(self, painter, rect):
 
         painter.fillRect(rect, schemastyle.BACKGROUND_COLOR)
 
         if self.drawGrid:
-            painter.setPen(schemastyle.GRID_COLOR)
-
-            xGridSize = 512
-            yGridSize = 512
-            gridSizeX = 40
-            gridSizeY = 20
-            
-            for i in range(yGridSize * 2):
-                y = i * gridSizeY - (yGridSize) * gridSizeY
-                painter.drawLine(-xGridSize * gridSizeX, y, xGridSize * gridSizeX, y)
-
-            for i in range(xGridSize * 2):
-                x = i * gridSizeX  - (xGridSize) * gridSizeX
-                painter.drawLine(x, -yGridSize * gridSizeY, x, yGridSize * gridSizeY)
+            self.grid.draw(painter, rect)
 
     def updateSceneRect(self):
         #Is called when there is a change in the scene
         #Update scene size to fit the current layout of the graph
         if not self.lockScene:
-            rect = self.itemsBoundingRect()
+            for item in self.movedItems:
+                rect = item.sceneBoundingRect()
+                self.bounds.insert(item, rect.left(), rect.top(), rect.right(), rect.bottom())
+            self.movedItems.clear()
+            bounds = self.bounds.bounds()
+            if bounds is None:
+                return
+            left, top, right, bottom = bounds
+            rect = QRectF(left, top, right - left, bottom - top)
             rect = QRectF(rect.x() - 50, rect.y() - 50, rect.width() + 100, rect.height() + 100)
             self.setSceneRect(rect)
         else:
@@ -201,64 +227,47 @@ class GraphWidget(QWidget):
         self.scene.clear()
 
         #Place graph objects based on the graph data
-        nodeList = []
-        nodePoints = []
+        nodes = []
+        nodeIndex = {}
         for n in self.graphData.nodes():
-            #Place nodes
             x, y = self.graphData.node[n]['pos']
-            func = self.graphData.node[n]['funcstr']
-            clashCode = self.graphData.node[n]['clashcode']
-            r, g, b = self.graphData.node[n]['color']
+            nodeIndex[n] = len(nodes)
+            nodes.append((n, x, y))
 
-            self.graph.addNode1_n  (n, x, y)
-            nPoint = [x, y]
-            nodeList.append(n)
-            nodePoints.append(nPoint)
-
-        #Check for self-looping edges first
+        #Self-looping edges get the first IO of a node, so they are placed first
+        selfLoops = []
+        otherEdges = []
+        self.tokensInScene = []
         for src, dst in self.graphData.edges():
-            #Place edges and tokens
-            node1 = nodeList.index(src)
-            node2 = nodeList.index(dst)
-            
-            if src == dst:
-                tokenValues = self.graphData[src][dst]['tkns']
-                pRates = self.graphData[src][dst]['prates']
-                cRates = self.graphData[src][dst]['crates']
-                resnr = self.graphData[src][dst]['res']
-                argnr = self.graphData[src][dst]['arg']
-                r, g, b = self.graphData[src][dst]['color']
-                color = QColor(r, g, b)
-                    
-                self.graph.addEdgeToNodes(node1, node2, 'right', 'left', src, dst, tokenValues, pRates, cRates, resnr, argnr, color)
-                
-        #Then place the rest of the edges (not self-looping)
-        for src, dst in self.graphData.edges():
-            #Place edges and tokens
-            node1 = nodeList.index(src)
-            node2 = nodeList.index(dst)
-            
-            if src != dst:
-                tokenValues = self.graphData[src][dst]['tkns']
-                pRates = self.graphData[src][dst]['prates']
-                cRates = self.graphData[src][dst]['crates']
-                resnr = self.graphData[src][dst]['res']
-                argnr = self.graphData[src][dst]['arg']
-                r, g, b = self.graphData[src][dst]['color']
-                color = QColor(r, g, b)
-                self.tokensInScene.append((src, dst))    
-
-                #If begin node is left of end node
-                if nodePoints[node1][0] < nodePoints[node2][0]:
-                    self.graph.addEdgeToNodes(node1, node2, 'right', 'left', src, dst, tokenValues, pRates, cRates, resnr, argnr, color)
-                elif nodePoints[node1][0] > nodePoints[node2][0]:
-                    self.graph.addEdgeToNodes(node1, node2, 'left', 'right', src, dst, tokenValues, pRates, cRates, resnr, argnr, color)
-                else:
-                    if nodePoints[node1][0] > self.centerOfGraph.x():
-                        self.graph.addEdgeToNodes(node1, node2, 'right', 'right', src, dst, tokenValues, pRates, cRates, resnr, argnr, color)
-                    else:
-                        self.graph.addEdgeToNodes(node1, node2, 'left', 'left', src, dst, tokenValues, pRates, cRates, resnr, argnr, color)
+            node1 = nodeIndex[src]
+            node2 = nodeIndex[dst]
+            edgeData = self.graphData[src][dst]
+            pRates = edgeData['prates']
+            cRates = edgeData['crates']
+            resnr = edgeData['res']
+            argnr = edgeData['arg']
+            r, g, b = edgeData['color']
+            color = QColor(r, g, b)
 
+            if src == dst:
+                selfLoops.append((node1, node2, 'right', 'left', pRates, cRates, resnr, argnr, color))
+                continue
+
+            self.tokensInScene.append((src, dst))
+            x1 = nodes[node1][1]
+            x2 = nodes[node2][1]
+            #If begin node is left of end node
+            if x1 < x2:
+                sides = ('right', 'left')
+            elif x1 > x2:
+                sides = ('left', 'right')
+            elif x1 > self.centerOfGraph.x():
+                sides = ('right', 'right')
+            else:
+                sides = ('left', 'left')
+            otherEdges.append((node1, node2) + sides + (pRates, cRates, resnr, argnr, color))
+
+        self.graph.addGraph(nodes, selfLoops + otherEdges)
 
     def editTokens(self, src, dst, newTokens):
         self.graphData[src][dst]['tkns'] = newTokens
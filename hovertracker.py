@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Hover state of the items in the scenes
+
+Items get a hover move event for every move of the mouse over them. The
+HoverTracker of an item keeps the part of the item that is hovered, like a
+socket or an IO, and only repaints the item or changes the cursor when that
+changes. All repaints are counted per second under HOVER_REPAINTS in the
+instrumentation.
+
+Items with a tracker do not call hoverEnterEvent() and hoverLeaveEvent() of
+QGraphicsItem, which would repaint the whole item once more.
+
+author: Rinse Wester
+
+"""
+
+import instrumentation
+
+HOVER_REPAINTS = 'hover repaints per s'
+
+
+class HoverTracker(object):
+    """
+    Hovered target and cursor of an item.
+
+    Parameters
+    ----------
+    item : the QGraphicsItem
+    target : the initial target, for example None or False when nothing is
+        hovered
+    repaint : optional callable repaint(old, new) that repaints the item
+        after the target changed from old to new. By default the whole item
+        is updated.
+    """
+
+    __slots__ = ('item', 'target', 'cursor', 'repaint')
+
+    def __init__(self, item, target=None, repaint=None):
+        self.item = item
+        self.target = target
+        self.cursor = None
+        self.repaint = repaint
+
+    def setTarget(self, target):
+        """
+        Sets the hovered target, returns True when it changed.
+        """
+        if target == self.target:
+            return False
+        old = self.target
+        self.target = target
+        if self.repaint is None:
+            self.item.update()
+        else:
+            self.repaint(old, target)
+        instrumentation.tick(HOVER_REPAINTS)
+        return True
+
+    def setCursor(self, cursor):
+        """
+        Sets the cursor shape of the item, None unsets it.
+        """
+        if cursor != self.cursor:
+            self.cursor = cursor
+            if cursor is None:
+                self.item.unsetCursor()
+            else:
+                self.item.setCursor(cursor)
+
+    def reset(self, target=None):
+        # Forget the state without repainting, for items leaving the scene
+        self.target = target
+        self.setCursor(None)
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight counters to see where time and work goes
+
+Code records values under a name with record(), for example the number of
+links reshaped in a frame. For every name the number of samples, the total,
+the maximum and the last value are kept, report() formats all of them.
+A Timer records the time spent in a phase of work that is interrupted, for
+example by yielding to the event loop. Events counted with tick() are
+recorded per second, for example the number of repaints while hovering.
+
+author: Rinse Wester
+
+"""
+
+import time
+from collections import OrderedDict
+
+
+class Stat(object):
+    """
+    Summary of the values recorded under one name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.total = 0
+        self.maximum = 0
+        self.last = 0
+
+    def add(self, value):
+        self.samples += 1
+        self.total += value
+        self.last = value
+        if value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self):
+        return self.total / self.samples if self.samples > 0 else 0
+
+    def __str__(self):
+        return '{}: n={} total={:g} mean={:g} max={:g} last={:g}'.format(
+            self.name, self.samples, self.total, self.mean, self.maximum, self.last)
+
+
+class Timer(object):
+    """
+    Measures the time spent between start() and pause() calls, stop()
+    records the total in seconds under name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        return self
+
+    def pause(self):
+        if self.started is not None:
+            self.elapsed += time.perf_counter() - self.started
+            self.started = None
+
+    def stop(self):
+        self.pause()
+        record(self.name, self.elapsed)
+
+
+class Rate(object):
+    """
+    Counts events and records the nr of events per second under name.
+
+    A window of interval seconds starts at the first event after the previous
+    window ended. Its count is recorded by the first event after the window
+    ended, or by flush() when the stat is read before that. Seconds without
+    events are therefore not recorded.
+    """
+
+    def __init__(self, name, interval=1.0):
+        self.name = name
+        self.interval = interval
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.windowStart = None
+
+    def add(self, n=1):
+        now = time.perf_counter()
+        self.flush(now)
+        if self.windowStart is None:
+            self.windowStart = now
+        self.count += n
+
+    def flush(self, now=None):
+        """
+        Records the count of the current window when the window has ended.
+        """
+        if now is None:
+            now = time.perf_counter()
+        if self.windowStart is not None and now - self.windowStart >= self.interval:
+            count = self.count
+            self.count = 0
+            self.windowStart = None
+            record(self.name, count / self.interval)
+
+
+stats = OrderedDict()
+rates = {}
+
+
+def stat(name):
+    """
+    Returns the Stat with the given name, it is created when needed.
+    """
+    r = rates.get(name)
+    if r is not None:
+        r.flush()
+    s = stats.get(name)
+    if s is None:
+        s = stats[name] = Stat(name)
+    return s
+
+
+def record(name, value=1):
+    stat(name).add(value)
+
+
+def tick(name, n=1):
+    """
+    Counts n events for the per second rate recorded under name.
+    """
+    r = rates.get(name)
+    if r is None:
+        r = rates[name] = Rate(name)
+    r.add(n)
+
+
+def reset():
+    for s in stats.values():
+        s.reset()
+    for r in rates.values():
+        r.reset()
+
+
+def report():
+    for r in rates.values():
+        r.flush()
+    return '\n'.join(str(s) for s in stats.values())
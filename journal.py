@@ -0,0 +1,299 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Append-only edit journal of a schematic file
+
+The journal of schem.json is stored in schem.json.journal, one JSON record per
+line. The first record identifies the snapshot (the schematic file) to which
+the journal belongs, every following record is an edit or a save marker:
+
+    {"op": "snapshot", "size": ..., "hash": ...}
+    {"op": "addComponent", "name": ..., "leftsockets": [...], "rightsockets": [...], "pos": [x, y]}
+    {"op": "removeComponent", "name": ...}
+    {"op": "moveComponent", "name": ..., "pos": [x, y]}
+    {"op": "addLink", "src": ..., "srcoutp": ..., "dst": ..., "dstinp": ..., "name": ...}
+    {"op": "removeLink", "src": ..., "srcoutp": ..., "dst": ..., "dstinp": ...}
+    {"op": "save"}
+
+Edits are appended as they are made. Saving only appends a save marker, so
+the saved state of the document is the snapshot plus all edits up to the last
+save marker. Edits after the last save marker are unsaved work that can be
+recovered after a crash. Once the journal grows long it is compacted: a new
+snapshot is written and the journal starts over.
+
+The journal file is only created or changed when the first edit is recorded
+or the document is saved, so opening a schematic does not write anything.
+
+A journal whose snapshot record does not match the schematic file (because
+the file was written by something else) is ignored.
+
+author: Rinse Wester
+
+"""
+
+import hashlib
+import json
+import os
+
+from atomicfile import openAtomic
+
+JOURNAL_EXT = '.journal'
+
+# Nr of edits after which a save writes a new snapshot
+COMPACT_OPS = 1000
+
+
+def _snapshotRecord(filename):
+    h = hashlib.blake2b(digest_size=20)
+    size = 0
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+            size += len(chunk)
+    return {'op': 'snapshot', 'size': size, 'hash': h.hexdigest()}
+
+
+class SchematicJournal(object):
+    """
+    Journal of the edits made to the schematic stored in filename.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = filename + JOURNAL_EXT
+        self.file = None
+        # Length of the existing journal file to keep when it is opened for
+        # writing, None when there is no valid journal file yet
+        self.keepEnd = None
+        self.savedOps = 0
+        self.unsavedOps = 0
+        # Edits made while a snapshot is being written, see beginSnapshot()
+        self.carried = None
+
+    @staticmethod
+    def read(filename):
+        """
+        Reads the journal of a schematic file.
+
+        Returns
+        -------
+        (saved, unsaved, savedEnd, end): lists with the saved and the unsaved
+            edit records, the offset in the journal just after the last save
+            marker and the offset just after the last complete record. None
+            when there is no valid journal for the file.
+        """
+        path = filename + JOURNAL_EXT
+        if not os.path.exists(path) or not os.path.exists(filename):
+            return None
+
+        saved = []
+        pending = []
+        savedEnd = None
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline().decode('utf-8'))
+            except ValueError:
+                return None
+            if header != _snapshotRecord(filename):
+                return None
+            savedEnd = end = f.tell()
+
+            for line in iter(f.readline, b''):
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    # Partially written record of a crash: the rest is lost
+                    break
+                end = f.tell()
+                if record['op'] == 'save':
+                    saved.extend(pending)
+                    pending = []
+                    savedEnd = end
+                else:
+                    pending.append(record)
+
+        return saved, pending, savedEnd, end
+
+    @staticmethod
+    def hasUnsavedChanges(filename):
+        """
+        Returns True when the journal of filename contains unsaved edits.
+        """
+        contents = SchematicJournal.read(filename)
+        return contents is not None and len(contents[1]) > 0
+
+    def open(self, recover=False):
+        """
+        Opens the journal for appending edits. The journal file itself is
+        created or truncated when the first record is written.
+
+        Parameters
+        ----------
+        recover : when True the unsaved edits of the journal are kept,
+            otherwise they are discarded
+
+        Returns
+        -------
+        list of edit records that should be replayed on the schematic file to
+        get the current state of the document
+        """
+        self.close()
+        contents = SchematicJournal.read(self.filename)
+        if contents is None:
+            self.keepEnd = None
+            self.savedOps = 0
+            self.unsavedOps = 0
+            return []
+
+        saved, unsaved, savedEnd, end = contents
+        if not recover:
+            unsaved = []
+            end = savedEnd
+        self.keepEnd = end
+        self.savedOps = len(saved)
+        self.unsavedOps = len(unsaved)
+        return saved + unsaved
+
+    def writable(self):
+        """
+        Returns True when the journal file can be created or written.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # A new snapshot replaces the journal, which needs a writable directory
+        if not os.access(directory, os.W_OK):
+            return False
+        return not os.path.exists(self.path) or os.access(self.path, os.W_OK)
+
+    def close(self):
+        if self.file is not None:
+            self.keepEnd = self.file.tell()
+            self.file.close()
+            self.file = None
+
+    def _openFile(self):
+        # Create the journal file, or drop the discarded edits from the
+        # existing one, when the first record is written
+        if self.file is None:
+            if self.keepEnd is None:
+                self.startSnapshot()
+            else:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(self.keepEnd)
+                self.file = open(self.path, 'a', encoding='utf-8')
+        return self.file
+
+    def record(self, op, **fields):
+        """
+        Appends an edit to the journal.
+        """
+        fields['op'] = op
+        f = self._openFile()
+        f.write(json.dumps(fields) + '\n')
+        f.flush()
+        self.unsavedOps += 1
+        if self.carried is not None:
+            self.carried.append(fields)
+
+    def commit(self):
+        """
+        Saves all edits made so far by appending a save marker.
+        """
+        f = self._openFile()
+        f.write('{"op": "save"}\n')
+        f.flush()
+        os.fsync(f.fileno())
+        self.savedOps += self.unsavedOps
+        self.unsavedOps = 0
+
+    def discardUnsaved(self):
+        """
+        Removes the unsaved edits from the journal.
+        """
+        if self.unsavedOps > 0:
+            self.close()
+            self.open(recover=False)
+            self._openFile()
+
+    def needsCompaction(self):
+        return self.savedOps + self.unsavedOps >= COMPACT_OPS
+
+    def beginSnapshot(self):
+        """
+        Marks the moment the state of the document is taken for a snapshot.
+
+        The edits recorded from now on are not part of the snapshot, they are
+        carried over to the new journal by startSnapshot().
+        """
+        self.carried = []
+
+    def abortSnapshot(self):
+        self.carried = None
+
+    def takeCarried(self):
+        """
+        Returns the edits recorded since beginSnapshot() and stops recording them.
+        """
+        carried = self.carried or []
+        self.carried = None
+        return carried
+
+    def startSnapshot(self, carried=()):
+        """
+        Starts a new journal for the current contents of the schematic file.
+        Call this after a complete snapshot has been written. The carried
+        edits are the unsaved edits made while the snapshot was written.
+        """
+        self.close()
+        with openAtomic(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(_snapshotRecord(self.filename)) + '\n')
+            for record in carried:
+                f.write(json.dumps(record) + '\n')
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.savedOps = 0
+        self.unsavedOps = len(carried)
+
+    @staticmethod
+    def applySaved(schem, filename):
+        """
+        Applies the saved edits of the journal of filename to a Schematic that
+        was just loaded from filename, without opening the journal.
+        """
+        contents = SchematicJournal.read(filename)
+        if contents is not None:
+            SchematicJournal.replay(schem, contents[0])
+
+    @staticmethod
+    def replay(schem, records):
+        """
+        Applies edit records to a Schematic.
+        """
+        for record in records:
+            SchematicJournal.apply(schem, record)
+
+    @staticmethod
+    def apply(schem, record):
+        """
+        Applies one edit record to a Schematic. Returns the key of the new
+        link for an addLink record, None otherwise.
+        """
+        op = record['op']
+        if op == 'addComponent':
+            schem.add_component(record['name'], leftsockets=record['leftsockets'],
+                rightsockets=record['rightsockets'], pos=record['pos'])
+        elif op == 'removeComponent':
+            # Removes the links of the component as well
+            schem.remove_node(record['name'])
+        elif op == 'moveComponent':
+            schem.node[record['name']]['pos'] = record['pos']
+        elif op == 'addLink':
+            return schem.add_link(record['src'], record['dst'], record['srcoutp'], record['dstinp'], name=record['name'])
+        elif op == 'removeLink':
+            src, dst = record['src'], record['dst']
+            for key, linkattr in list(schem[src][dst].items()):
+                if linkattr['srcoutp'] == record['srcoutp'] and linkattr['dstinp'] == record['dstinp']:
+                    schem.remove_edge(src, dst, key)
+                    break
+        else:
+            raise ValueError('Unknown journal record ' + op)
+        return None
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Incremental reader for JSON documents with large top-level arrays
+
+author: Rinse Wester
+
+"""
+
+import json
+
+# Number of characters read from the file per step
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONStreamReader(object):
+    """
+    Reads a JSON document of the form {"key": [item, ...], ...} piece by piece.
+
+    Items of top-level arrays are decoded one at a time so that only a single
+    item has to be kept in memory, independent of the size of the file. Values
+    that are not arrays are decoded as a whole.
+    """
+
+    def __init__(self, fileobj, chunksize=CHUNK_SIZE, progress=None):
+        self.fileobj = fileobj
+        self.chunksize = chunksize
+        self.progress = progress
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.charsRead = 0
+
+    def events(self):
+        """
+        Generator yielding (key, value) tuples in file order.
+
+        For array values a tuple is produced for every item in the array, for
+        all other values a single tuple with the complete value is produced.
+
+        Raises
+        ------
+        ValueError
+            When the document is not a JSON object, is malformed or has data
+            after the object.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            self._expectEnd()
+            return
+
+        while True:
+            key = self._decodeValue()
+            if not isinstance(key, str):
+                raise ValueError('Expected a string as key at position ' + str(self._offset()))
+            self._expect(':')
+
+            if self._peek() == '[':
+                self.pos += 1
+                if self._peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self._decodeValue()
+                        if self._nextOf(',]') == ']':
+                            break
+            else:
+                yield key, self._decodeValue()
+
+            if self._nextOf(',}') == '}':
+                break
+        self._expectEnd()
+
+    def _fill(self):
+        # Drop the consumed part of the buffer and append the next chunk
+        chunk = self.fileobj.read(self.chunksize)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if chunk == '':
+            self.eof = True
+        else:
+            self.charsRead += len(chunk)
+            if self.progress is not None:
+                self.progress(self.charsRead)
+        return chunk != ''
+
+    def _offset(self):
+        return self.charsRead - len(self.buf) + self.pos
+
+    def _peek(self):
+        # Skip whitespace and return the next character without consuming it
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError("Expected '{}' at position {}".format(char, self._offset()))
+        self.pos += 1
+
+    def _expectEnd(self):
+        # Only whitespace may follow the object
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                raise ValueError('Unexpected data after the JSON document at position ' + str(self._offset()))
+            if not self._fill():
+                return
+
+    def _nextOf(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError("Expected one of '{}' at position {}".format(chars, self._offset()))
+        self.pos += 1
+        return char
+
+    def _decodeValue(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Most likely the value is split over two chunks, read more
+                if self._fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof and not isinstance(value, (dict, list, str)):
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
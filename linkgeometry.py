@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Batch computation of the geometry of links and CSDF edges
+
+After loading a file or moving many components at once, the curves of many
+links have to be recomputed. The end points of all of them are gathered in
+arrays first, the control points and bounding boxes are computed with NumPy
+for all links together and only then are the paths pushed into the items.
+
+NumPy is optional: without it, or for a few links only, every item computes
+its own geometry as before.
+
+author: Rinse Wester
+
+"""
+
+import math
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPainterPath
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Horizontal distance between the end points and control points of a link
+LINK_CURVE_OFFSET = 100
+
+# Below this nr of items, computing the geometry one item at a time is faster
+BATCH_MIN_ITEMS = 64
+
+
+def linkPath(points):
+    """
+    Returns the bezier curve of a link.
+
+    Parameters
+    ----------
+    points : srcX, srcY, c1X, c1Y, c2X, c2Y, dstX, dstY of the curve
+    """
+    srcX, srcY, c1X, c1Y, c2X, c2Y, dstX, dstY = points
+    path = QPainterPath()
+    path.setFillRule(Qt.WindingFill)
+    path.moveTo(srcX, srcY)
+    path.cubicTo(c1X, c1Y, c2X, c2Y, dstX, dstY)
+    return path
+
+
+def distanceToPath(path, x, y):
+    """
+    Returns the distance from (x, y) to the nearest point on the outline of
+    path, which is flattened into line segments by Qt.
+    """
+    best = None
+    for polygon in path.toSubpathPolygons():
+        points = [(p.x(), p.y()) for p in polygon]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            dx = x1 - x0
+            dy = y1 - y0
+            length2 = dx * dx + dy * dy
+            # Nearest point on the segment
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length2))
+            d2 = (x0 + t * dx - x) ** 2 + (y0 + t * dy - y) ** 2
+            if best is None or d2 < best:
+                best = d2
+    return math.sqrt(best) if best is not None else math.inf
+
+
+def linkControlPoints(ends):
+    """
+    Computes the curves of links.
+
+    Parameters
+    ----------
+    ends : array of shape (n, 4) with srcX, srcY, dstX, dstY of every link
+
+    Returns
+    -------
+    points : array of shape (n, 8) with the points of every curve, see
+        linkPath()
+    rects : array of shape (n, 4) with left, top, right, bottom of the
+        control points of every curve, which contain the curve
+    """
+    srcX, srcY, dstX, dstY = ends.T
+    points = numpy.column_stack((srcX, srcY, srcX + LINK_CURVE_OFFSET, srcY,
+        dstX - LINK_CURVE_OFFSET, dstY, dstX, dstY))
+    xs = points[:, 0::2]
+    ys = points[:, 1::2]
+    rects = numpy.column_stack((xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)))
+    return points, rects
+
+
+def updateLinkShapes(links):
+    """
+    Same as calling updateShape() of every link in links.
+
+    Returns
+    -------
+    array of shape (n, 4) with the left, top, right and bottom of the
+    control points of every link, or None when the shapes were made one at a
+    time
+    """
+    if numpy is None or len(links) < BATCH_MIN_ITEMS:
+        for link in links:
+            link.updateShape()
+        return None
+
+    ends = numpy.array([link.srcSocket.linkConnectionPos() + link.dstSocket.linkConnectionPos()
+        for link in links], dtype=float)
+    points, rects = linkControlPoints(ends)
+    for link, linkPoints in zip(links, points.tolist()):
+        link.setShape(linkPoints)
+    return rects
+
+
+def edgeCurvePoints(points, beginRight, endRight, selfLoops):
+    """
+    Computes the curves of CSDF edges like Edge.calculateCurvePoints().
+
+    Parameters
+    ----------
+    points : array of shape (n, 4) with beginX, beginY, endX, endY of every
+        edge
+    beginRight, endRight : boolean arrays, True when the begin or end of an
+        edge is on the right side of its node
+    selfLoops : boolean array, True for edges from a node to itself
+
+    Returns
+    -------
+    array of shape (n, 6) with endX, endY, c1X, c1Y, c2X, c2Y of every edge.
+    The end point differs from the given one when it equals the begin point.
+    """
+    beginX, beginY, endX, endY = points.T
+    endX = endX.copy()
+
+    # An end point at the begin point is moved a bit
+    same = (beginX == endX) & (beginY == endY)
+    endX[same] += numpy.where(beginRight[same], -0.01, 0.01)
+
+    dy = numpy.abs(beginY - endY)
+    xDiff = numpy.maximum(numpy.abs(beginX - endX), 400) / 4
+    # Direction in which the curve leaves the begin and enters the end
+    beginDir = numpy.where(beginRight, 1.0, -1.0)
+    endDir = numpy.where(endRight, 1.0, -1.0)
+    opposite = beginRight != endRight
+
+    c1X = beginX + beginDir * xDiff
+    c2X = endX + endDir * xDiff
+    # Straight when the IO on opposite sides are at about the same height
+    close = opposite & (dy < 25)
+    c1X = numpy.where(close, beginX, c1X)
+    c2X = numpy.where(close, endX, c2X)
+
+    # Loop around when the nodes are switched around or the edge loops to the
+    # same node
+    crossed = opposite & (dy < 55) & numpy.where(beginRight, beginX > endX, beginX < endX)
+    loops = crossed | (opposite & selfLoops)
+    c1X = numpy.where(loops, beginX + 100 * beginDir, c1X)
+    c2X = numpy.where(loops, endX + 100 * endDir, c2X)
+    yTranslation = numpy.where(loops | (~opposite & (dy < 35)), -45.0, 0.0)
+
+    return numpy.column_stack((endX, endY, c1X, beginY + yTranslation, c2X, endY + yTranslation))
+
+
+def updateEdgeCurves(edges):
+    """
+    Same as calling calculateCurvePoints() and updatePCRects() of every edge
+    in edges.
+    """
+    edges = list(edges)
+    if numpy is None or len(edges) < BATCH_MIN_ITEMS:
+        for edge in edges:
+            edge.calculateCurvePoints(edge.beginPoint, edge.endPoint)
+            edge.updatePCRects()
+        return
+
+    points = numpy.array([(edge.beginPoint.x(), edge.beginPoint.y(), edge.endPoint.x(), edge.endPoint.y())
+        for edge in edges], dtype=float)
+    beginRight = numpy.array([edge.beginSide == 'right' for edge in edges])
+    endRight = numpy.array([edge.endSide == 'right' for edge in edges])
+    selfLoops = numpy.array([bool(edge.edgeSelfLoops) for edge in edges])
+    curves = edgeCurvePoints(points, beginRight, endRight, selfLoops)
+    for edge, curve in zip(edges, curves.tolist()):
+        edge.setCurvePoints(*curve)
+        edge.updatePCRects()
@@ -11,27 +11,29 @@ author: Rinse Wester
 import sys
 from PyQt5.QtWidgets import QWidget, QGraphicsItem, QGraphicsPathItem, QMenu, QAction
 from PyQt5.QtCore import QRectF, QRect, QPointF, QPoint, Qt, QVariant
-from PyQt5.QtGui import QColor, QPainter, QPen, QBrush, QPainterPath, QFont
+from PyQt5.QtGui import QColor, QPainter, QPen, QBrush, QFont
 from collections import Counter
 import schemastyle
+from hovertracker import HoverTracker
+from linkgeometry import linkPath, LINK_CURVE_OFFSET
 
 class LinkGI(QGraphicsPathItem):
 
-    def __init__(self, name, srcSocket, dstSocket, thickness=2):
+    def __init__(self, name, srcSocket, dstSocket, thickness=2, deferShape=False):
         super().__init__()
 
         self.setFlag(QGraphicsItem.ItemIsSelectable, True)
         self.setAcceptHoverEvents(True)
-        self.hovering = False
+        self.hoverState = HoverTracker(self, False, self.repaintHighlight)
 
         self.linkName = name
+        # Key of the edge of this link in the schematic of the scene
+        self.edgeKey = None
         self.srcSocket = srcSocket
         self.dstSocket = dstSocket
         self.srcSocket.link = self
         self.dstSocket.link = self
 
-        self.updateShape()
-
         # set the pen style
         self.linkPen = QPen()
         self.linkPen.setWidth(thickness)
@@ -39,26 +41,56 @@ class LinkGI(QGraphicsPathItem):
         self.linkPen.setColor(schemastyle.LINK_COLOR)
         self.setPen(self.linkPen)
 
+        # When loading, the shapes of all links are made at once later on,
+        # see linkgeometry.updateLinkShapes()
+        if not deferShape:
+            self.updateShape()
+
     def updateShape(self):
         # Create the bezier curve path
         srcX, srcY = self.srcSocket.linkConnectionPos()
         dstX, dstY = self.dstSocket.linkConnectionPos()
-        linkPath = QPainterPath()
-        linkPath.setFillRule(Qt.WindingFill)
-        linkPath.moveTo(srcX, srcY)
-        linkPath.cubicTo(srcX + 100, srcY, dstX - 100, dstY, dstX, dstY)
-        
-        self.setPath(linkPath)
-
+        self.setShape((srcX, srcY, srcX + LINK_CURVE_OFFSET, srcY,
+            dstX - LINK_CURVE_OFFSET, dstY, dstX, dstY))
+
+    def setShape(self, points):
+        # points of the curve as in linkgeometry.linkPath()
+        # The end points are kept for drawing at lower levels of detail
+        self.srcPos = QPointF(points[0], points[1])
+        self.dstPos = QPointF(points[6], points[7])
+        self.setPath(linkPath(points))
+
+    def paint(self, painter, option, widget):
+        tier = schemastyle.lodTier(option.levelOfDetailFromTransform(painter.worldTransform()))
+        if tier <= schemastyle.LOD_TIER_MEDIUM:
+            super().paint(painter, option, widget)
+        elif tier == schemastyle.LOD_TIER_LOW:
+            # A straight line is enough when zoomed out
+            painter.setPen(self.pen())
+            painter.drawLine(self.srcPos, self.dstPos)
+        # In the overview links are part of the density layer of the scene
+
+    # Not calling super() in the hover events, setting the pen repaints
     def hoverEnterEvent(self, event):
-        self.linkPen.setColor(QColor(Qt.white))
-        self.setPen(self.linkPen)
-        super().hoverEnterEvent(event)
+        self.setHighlighted(True)
 
     def hoverLeaveEvent(self, event):
-        self.linkPen.setColor(QColor(Qt.gray))
+        self.setHighlighted(False)
+
+    @property
+    def hovering(self):
+        return self.hoverState.target
+
+    def setHighlighted(self, highlighted):
+        # The pen is only changed when highlighting changes
+        self.hoverState.setTarget(highlighted)
+
+    def repaintHighlight(self, old, highlighted):
+        if highlighted:
+            self.linkPen.setColor(QColor(Qt.white))
+        else:
+            self.linkPen.setColor(QColor(Qt.gray))
         self.setPen(self.linkPen)
-        super().hoverLeaveEvent(event)
 
     @property
     def name(self):
@@ -107,10 +139,6 @@ class PartialLinkGI(QGraphicsPathItem):
         # Create the bezier curve path
         srcX, srcY = self.srcSocket.linkConnectionPos()
         dstX, dstY = self.dstTempPos
-        linkPath = QPainterPath()
-        linkPath.setFillRule(Qt.WindingFill)
-        linkPath.moveTo(srcX, srcY)
-        linkPath.cubicTo(srcX + 100, srcY, dstX - 100, dstY, dstX, dstY)
-        
-        self.setPath(linkPath)
+        self.setPath(linkPath((srcX, srcY, srcX + LINK_CURVE_OFFSET, srcY,
+            dstX - LINK_CURVE_OFFSET, dstY, dstX, dstY)))
 
@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Batched drawing of the links that are not interacted with
+
+A scene with many links spends most of its time indexing and dispatching
+paint calls for every single LinkGI. Links that are idle, that is not
+selected, hovered or attached to a component being dragged, are therefore
+not added to the scene themselves. They are drawn as one combined path per
+tile of the scene by a LinkTileGI instead.
+
+A link is promoted to a real LinkGI item in the scene when the user starts
+to interact with it and demoted to its tile again afterwards. Finding the
+link under the mouse uses a separate grid index of the bounding rectangles of
+the links, only the links near the mouse are tested on their path.
+
+author: Rinse Wester
+
+"""
+
+import math
+
+from PyQt5.QtWidgets import QGraphicsItem
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPen, QPainterPath
+
+import schemastyle
+from linkgeometry import distanceToPath
+from spatialindex import RectIndex
+
+# Size of the tiles in scene coordinates
+TILE_SIZE = 1000
+
+# Size of the cells of the index used for hit-testing
+LINK_INDEX_CELL_SIZE = 200
+
+
+class LinkTileGI(QGraphicsItem):
+    """
+    Draws all idle links of which the source lies in one tile.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.links = set()
+        self.curvePath = None
+        self.linePath = None
+        self.bRect = QRectF()
+
+        self.linkPen = QPen()
+        self.linkPen.setWidth(2)
+        self.linkPen.setCapStyle(Qt.RoundCap)
+        self.linkPen.setColor(schemastyle.LINK_COLOR)
+
+    def addLink(self, link):
+        self.addLinks([link], link.path().controlPointRect())
+
+    def addLinks(self, links, rect):
+        # rect contains the control points of all links
+        self.links.update(links)
+        # The bounding rectangle only grows, after removing links it is
+        # larger than needed but still correct
+        rect = rect.adjusted(-2, -2, 2, 2)
+        if not self.bRect.contains(rect):
+            self.prepareGeometryChange()
+            self.bRect = self.bRect.united(rect)
+        self.linksChanged(rect)
+
+    def removeLink(self, link):
+        self.links.discard(link)
+        # Only the area of the link has to be repainted, which matters when
+        # links are promoted and demoted while hovering
+        self.linksChanged(link.path().controlPointRect().adjusted(-2, -2, 2, 2))
+
+    def linksChanged(self, rect=None):
+        # Rebuild the paths when painted next time, rect is the area that
+        # changed or None for the whole tile
+        self.curvePath = None
+        self.linePath = None
+        if rect is None:
+            self.update()
+        else:
+            self.update(rect)
+
+    def boundingRect(self):
+        return self.bRect
+
+    def paint(self, painter, option, widget):
+        tier = schemastyle.lodTier(option.levelOfDetailFromTransform(painter.worldTransform()))
+        if tier <= schemastyle.LOD_TIER_MEDIUM:
+            if self.curvePath is None:
+                self.curvePath = QPainterPath()
+                for link in self.links:
+                    self.curvePath.addPath(link.path())
+            painter.strokePath(self.curvePath, self.linkPen)
+        elif tier == schemastyle.LOD_TIER_LOW:
+            if self.linePath is None:
+                self.linePath = QPainterPath()
+                for link in self.links:
+                    self.linePath.moveTo(link.srcPos)
+                    self.linePath.lineTo(link.dstPos)
+            painter.strokePath(self.linePath, self.linkPen)
+        # In the overview links are part of the density layer of the scene
+
+
+class LinkLayer(object):
+    """
+    Keeps track of the idle and promoted links of a scene.
+
+    Parameters
+    ----------
+    scene : the SchemaScene of the links
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.tiles = {}
+        # tile of every idle link
+        self.tileOf = {}
+        self.promoted = set()
+        self.hovered = None
+
+        # Control point rectangles of the links. Links are indexed when they
+        # are added, reshaped links only when the index is queried.
+        self.index = RectIndex(LINK_INDEX_CELL_SIZE)
+        self.unindexed = set()
+
+    def clear(self):
+        # The items have been removed from the scene already
+        self.tiles.clear()
+        self.tileOf.clear()
+        self.promoted.clear()
+        self.hovered = None
+        self.index.clear()
+        self.unindexed.clear()
+
+    def isPromoted(self, link):
+        return link in self.promoted
+
+    def add(self, link):
+        self.addToTile(link)
+        self.indexLink(link)
+
+    def addLinks(self, links, rects=None):
+        """
+        Same as add() for every link in links, but every tile is updated once.
+
+        Parameters
+        ----------
+        rects : optional array of shape (n, 4) with the left, top, right and
+            bottom of the control points of every link, as returned by
+            linkgeometry.updateLinkShapes()
+        """
+        for tile, indices in self.groupByTile(links).items():
+            tileLinks = [links[i] for i in indices]
+            if rects is None:
+                rect = QRectF()
+                for link in tileLinks:
+                    rect = rect.united(link.path().controlPointRect())
+            else:
+                sides = rects[indices]
+                left, top = sides[:, :2].min(axis=0)
+                right, bottom = sides[:, 2:].max(axis=0)
+                rect = QRectF(left, top, right - left, bottom - top)
+            tile.addLinks(tileLinks, rect)
+            for link in tileLinks:
+                self.tileOf[link] = tile
+
+        if rects is None:
+            for link in links:
+                self.indexLink(link)
+        else:
+            for link, (left, top, right, bottom) in zip(links, rects.tolist()):
+                self.index.insert(link, left, top, right, bottom)
+        self.unindexed.difference_update(links)
+
+    def remove(self, link):
+        if link in self.promoted:
+            self.promoted.discard(link)
+            self.scene.removeItem(link)
+        else:
+            self.removeFromTile(link)
+        if self.hovered is link:
+            self.hovered = None
+        self.unindexed.discard(link)
+        self.index.remove(link)
+
+    def reshaped(self, link):
+        # The path of link changed
+        if link not in self.promoted:
+            self.removeFromTile(link)
+            self.addToTile(link)
+        self.unindexed.add(link)
+
+    def reshapedLinks(self, links, rects=None):
+        # Same as reshaped() for every link in links, with rects as in
+        # addLinks()
+        idle = [i for i, link in enumerate(links) if link not in self.promoted]
+        changed = set()
+        for i in idle:
+            tile = self.tileOf.pop(links[i], None)
+            if tile is not None:
+                tile.links.discard(links[i])
+                changed.add(tile)
+        for tile in changed:
+            tile.linksChanged()
+        self.addLinks([links[i] for i in idle], rects[idle] if rects is not None else None)
+        self.unindexed.update(link for link in links if link in self.promoted)
+
+    def promote(self, link):
+        # Make link a real item of the scene
+        if link not in self.promoted:
+            self.removeFromTile(link)
+            self.promoted.add(link)
+            self.scene.addItem(link)
+
+    def demote(self, link):
+        # Let the tile draw link again, unless it is still in use
+        if link in self.promoted and not link.isSelected() and link is not self.hovered:
+            self.promoted.discard(link)
+            self.scene.removeItem(link)
+            link.setHighlighted(False)
+            self.addToTile(link)
+
+    def demoteIdle(self):
+        for link in list(self.promoted):
+            self.demote(link)
+
+    def hover(self, link):
+        # Called with the link under the mouse, or None
+        if link is not self.hovered:
+            old = self.hovered
+            self.hovered = link
+            if old is not None:
+                self.demote(old)
+            if link is not None:
+                self.promote(link)
+
+    def linkAt(self, x, y, radius):
+        """
+        Returns the link nearest to (x, y) within radius, or None.
+        """
+        for link in self.unindexed:
+            self.indexLink(link)
+        self.unindexed.clear()
+
+        # The curve of a link lies within the rectangle of its control points
+        nearest = None
+        for link in self.index.inRect(x - radius, y - radius, x + radius, y + radius):
+            distance = distanceToPath(link.path(), x, y)
+            if distance <= radius and (nearest is None or distance < nearest[0]):
+                nearest = (distance, link)
+        return nearest[1] if nearest is not None else None
+
+    def idleLinksIn(self, area, mode=Qt.IntersectsItemShape):
+        """
+        Returns the idle links in area, a QPainterPath in scene coordinates,
+        selected like QGraphicsScene.items(area, mode) selects items.
+        """
+        rect = area.boundingRect()
+        found = []
+        for tile in self.tiles.values():
+            if tile.links and tile.boundingRect().intersects(rect):
+                found.extend(link for link in tile.links if link.collidesWithPath(link.mapFromScene(area), mode))
+        return found
+
+    def tile(self, link):
+        # The tile in which the source of link lies
+        key = (math.floor(link.srcPos.x() / TILE_SIZE), math.floor(link.srcPos.y() / TILE_SIZE))
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = LinkTileGI()
+            self.scene.addItem(tile)
+        return tile
+
+    def groupByTile(self, links):
+        # The indices of links per tile
+        groups = {}
+        for i, link in enumerate(links):
+            groups.setdefault(self.tile(link), []).append(i)
+        return groups
+
+    def addToTile(self, link):
+        tile = self.tile(link)
+        tile.addLink(link)
+        self.tileOf[link] = tile
+
+    def removeFromTile(self, link):
+        tile = self.tileOf.pop(link, None)
+        if tile is not None:
+            tile.removeLink(link)
+
+    def indexLink(self, link):
+        rect = link.path().controlPointRect()
+        self.index.insert(link, rect.left(), rect.top(), rect.right(), rect.bottom())
@@ -9,12 +9,14 @@ author: Rinse Wester
 """
 
 import sys
-from PyQt5.QtWidgets import QDockWidget, QListWidget, QHBoxLayout, QWidget, QApplication, QMainWindow, QAction, QFileDialog, QMessageBox, qApp
-from PyQt5.QtCore import Qt, QMimeData
+import time
+from PyQt5.QtWidgets import QDockWidget, QListWidget, QHBoxLayout, QWidget, QApplication, QMainWindow, QAction, QFileDialog, QMessageBox, QProgressBar, QPushButton
+from PyQt5.QtCore import Qt, QMimeData, QTimer
 from PyQt5.QtGui import QIcon, QDrag
 
 from schemaview import SchemaView, SchemaScene
-import schemastyle
+from journal import SchematicJournal
+from fileworkers import LoadWorker, SaveWorker
 
 class CompListWidget(QListWidget):
 
@@ -36,6 +38,9 @@ class MainWindow(QMainWindow):
 
     DEFAULT_FILE = 'schemas/schem1.json'
 
+    # Max time in seconds spent on creating scene items per event loop iteration
+    POPULATE_TIME_SLICE = 0.015
+
     def __init__(self):
         super().__init__()
         self.initUI()
@@ -60,7 +65,7 @@ class MainWindow(QMainWindow):
         exitAction = QAction(QIcon('images/exit.png'), '&Exit', self)
         exitAction.setShortcut('Ctrl+Q')
         exitAction.setStatusTip('Exit application')
-        exitAction.triggered.connect(qApp.quit)
+        exitAction.triggered.connect(self.close)
 
         graphmenu = self.menuBar().addMenu('&Schema')
         graphmenu.addAction(openAction)
@@ -94,13 +99,26 @@ class MainWindow(QMainWindow):
         if sys.platform == 'darwin':
             self.setUnifiedTitleAndToolBarOnMac(True)
 
+        self.fileActions = [openAction, saveAction, saveAsAction]
+
+        # Progress and cancellation of opening and saving files in the background
+        self.worker = None
+        self.populateTimer = None
+        self.progressBar = QProgressBar()
+        self.progressBar.setMaximumWidth(200)
+        self.cancelButton = QPushButton('Cancel')
+        self.cancelButton.clicked.connect(self.cancelOperation)
+        self.statusBar().addPermanentWidget(self.progressBar)
+        self.statusBar().addPermanentWidget(self.cancelButton)
+        self.progressBar.hide()
+        self.cancelButton.hide()
+
         self.currentFile = MainWindow.DEFAULT_FILE
 
         self.schemaview = SchemaView()
         self.schemascene = SchemaScene()
-        self.schemascene.loadFromFile(self.currentFile)
         self.schemaview.setScene(self.schemascene)
-        self.schemaview.resetView()
+        self.loadFile(self.currentFile)
 
         # connect the view menu actions to the graphwidget
         zoomInAction.triggered.connect(self.schemaview.zoomIn)
@@ -133,28 +151,191 @@ class MainWindow(QMainWindow):
         filename, _ = QFileDialog.getOpenFileName( self, 'Open schematic', './schemas')
 
         if filename != '':
+            self.loadFile(filename)
+
+    def loadFile(self, filename):
+        # Parse the file in a worker thread, then create the scene items in
+        # time slices on the GUI thread
+        worker = LoadWorker(filename, recover=self.askRecover(filename))
+        self.startOperation(worker, 'Opening ' + filename)
+        worker.finished.connect(lambda: self.onFileLoaded(worker, filename))
+        worker.start()
+
+    def onFileLoaded(self, worker, filename):
+        if worker.cancelled:
+            self.endOperation('Opening cancelled')
+            return
+        if worker.error is not None or worker.result is None:
+            self.endOperation()
+            self.showOpenError(worker.error if worker.error is not None else 'Nothing was read from ' + filename)
+            return
+
+        # The new scene is filled while the current one stays usable
+        schem, journal = worker.result
+        scene = SchemaScene()
+        populator = scene.populate(schem, journal)
+        self.cancelButton.setEnabled(True)
+        self.statusBar().showMessage('Creating items for ' + filename)
+
+        def populateSlice():
+            deadline = time.perf_counter() + MainWindow.POPULATE_TIME_SLICE
+            finished = False
+            error = None
             try:
-                self.currentFile = filename
-                self.schemascene.loadFromFile(self.currentFile)
+                while time.perf_counter() < deadline:
+                    done, total = next(populator)
+                    self.showProgress(done, total)
+            except StopIteration:
+                finished = True
+                self.schemascene.closeJournal()
+                self.schemascene = scene
                 self.schemaview.setScene(self.schemascene)
                 self.schemaview.resetView()
-            except (FileNotFoundError, ValueError, KeyError) as e:
-                QMessageBox.critical(
-                    self, 'Error opening file',
-                    '<b>Error opening file:</b>' + '\n\n' + str(e))
+                self.currentFile = filename
+            except Exception as e:
+                # Drop the new scene, the current one stays
+                finished = True
+                error = e
+                if journal is not None:
+                    journal.close()
+            finally:
+                # The file actions are enabled again whatever happened
+                if finished:
+                    self.populateTimer.stop()
+                    self.populateTimer = None
+                    self.endOperation('Opened ' + filename if error is None else '')
+            if error is not None:
+                self.showOpenError(error)
+
+        self.populateJournal = journal
+        self.populateTimer = QTimer(self)
+        self.populateTimer.timeout.connect(populateSlice)
+        self.populateTimer.start(0)
+
+    def showOpenError(self, e):
+        QMessageBox.critical(
+            self, 'Error opening file',
+            '<b>Error opening file:</b>' + '\n\n' + str(e))
+
+    def askRecover(self, filename):
+        # Offer to recover the edits that were not saved before a crash
+        if not SchematicJournal.hasUnsavedChanges(filename):
+            return False
+        answer = QMessageBox.question(
+            self, 'Recover unsaved changes',
+            '<b>{}</b> has unsaved changes from a previous session.<br/><br/>'
+            'Do you want to recover them?'.format(filename),
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        return answer == QMessageBox.Yes
+
+    def closeEvent(self, event):
+        if self.populateTimer is not None:
+            self.populateTimer.stop()
+            self.populateTimer = None
+            if self.populateJournal is not None:
+                self.populateJournal.close()
+        if self.worker is not None:
+            if isinstance(self.worker, SaveWorker):
+                # Let the save finish, cancelling it would lose the file
+                worker = self.worker
+                worker.wait()
+                self.onFileSaved(worker, self.schemascene, worker.filename)
+            else:
+                self.worker.cancel()
+                self.worker.wait()
+        # Write a complete snapshot when everything is saved, unsaved edits
+        # stay in the journal so they can be recovered next time
+        self.schemascene.compactJournal()
+        self.schemascene.closeJournal()
+        super().closeEvent(event)
 
     def saveFile(self):
-        self.schemascene.saveToFile(self.currentFile)
+        self.saveTo(self.currentFile)
 
     def saveFileAs(self):
         filename, _ = QFileDialog.getSaveFileName(self, 'Save schematic as', './schemas')
         if filename != '':
+            self.saveTo(filename)
+
+    def saveTo(self, filename):
+        try:
+            if self.schemascene.saveJournal(filename):
+                self.statusBar().showMessage('Saved ' + filename, 2000)
+                return
+        except OSError as e:
+            self.showSaveError(e)
+            return
+
+        # Take a snapshot of the scene and write it in a worker thread while
+        # editing continues
+        scene = self.schemascene
+        worker = SaveWorker(scene.prepareSnapshot(), filename)
+        self.startOperation(worker, 'Saving ' + filename)
+        worker.finished.connect(lambda: self.onFileSaved(worker, scene, filename))
+        worker.start()
+
+    def onFileSaved(self, worker, scene, filename):
+        if worker is not self.worker:
+            # Already handled when closing
+            return
+        if worker.error is None and not worker.cancelled:
             try:
-                self.schemascene.saveToFile(filename)
-            except (FileNotFoundError, ValueError, KeyError) as e:
-                QMessageBox.critical(
-                    self, 'Error savig file',
-                    '<b>Error:</b>' + '\n\n' + str(e))
+                scene.finishSnapshot(filename)
+            except OSError as e:
+                worker.error = e
+        else:
+            scene.abortSnapshot()
+
+        if worker.error is not None:
+            self.endOperation()
+            self.showSaveError(worker.error)
+        elif worker.cancelled:
+            self.endOperation('Saving cancelled')
+        else:
+            self.endOperation('Saved ' + filename)
+
+    def showSaveError(self, e):
+        QMessageBox.critical(
+            self, 'Error savig file',
+            '<b>Error:</b>' + '\n\n' + str(e))
+
+    def startOperation(self, worker, message):
+        # Show progress of a background operation, only one runs at a time
+        self.worker = worker
+        worker.progressChanged.connect(self.showProgress)
+        for action in self.fileActions:
+            action.setEnabled(False)
+        self.statusBar().showMessage(message)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.cancelButton.show()
+
+    def showProgress(self, done, total):
+        self.progressBar.setMaximum(max(total, 1))
+        self.progressBar.setValue(done)
+
+    def endOperation(self, message=''):
+        self.worker = None
+        for action in self.fileActions:
+            action.setEnabled(True)
+        self.progressBar.hide()
+        self.cancelButton.hide()
+        if message != '':
+            self.statusBar().showMessage(message, 2000)
+        else:
+            self.statusBar().clearMessage()
+
+    def cancelOperation(self):
+        if self.populateTimer is not None:
+            # Creating the items of a new scene: just drop the new scene
+            self.populateTimer.stop()
+            self.populateTimer = None
+            if self.populateJournal is not None:
+                self.populateJournal.close()
+            self.endOperation('Opening cancelled')
+        elif self.worker is not None:
+            self.cancelButton.setEnabled(False)
+            self.worker.cancel()
 
 if __name__ == '__main__':
 
@@ -12,11 +12,33 @@ import sys
 from PyQt5.QtWidgets import QWidget, QGraphicsItem, QPushButton, QVBoxLayout, QMenu, QAction, QInputDialog, QMessageBox
 from PyQt5.QtCore import QRectF, QRect, QPointF, QPoint, Qt, QVariant
 from PyQt5.QtGui import QColor, QPainter, QBrush, QPainterPath, QLinearGradient, QFont, QContextMenuEvent
-from collections import Counter
+from collections import OrderedDict
 import schemastyle
+from linkgeometry import updateEdgeCurves
+from hovertracker import HoverTracker
+
+
+class NodeIO(object):
+    #One input/output of a node, ioType is 0 for neutral, 1 for input and 2 for output
+    __slots__ = ('x', 'y', 'hasEdge', 'side', 'ioType', 'hover', 'name')
+
+    def __init__(self, x, y, hasEdge, side, ioType, hover, name):
+        self.x = x
+        self.y = y
+        self.hasEdge = hasEdge
+        self.side = side
+        self.ioType = ioType
+        self.hover = hover
+        self.name = name
+
 
 class Node(QGraphicsItem):
 
+    # Resolution the nodes snap to, independent of the grid drawn by the
+    # GraphicsScene
+    GRID_X_RES = 40
+    GRID_Y_RES = 10
+
     def __init__(self, widget, view, nodeName):
         super().__init__()
         
@@ -41,6 +63,12 @@ class Node(QGraphicsItem):
 
         self.edgeList = []
         self.ioList = []
+        #Indices in ioList of the IO per side, in order from top to bottom
+        self.ioSides = {'left': [], 'right': []}
+        #Index of the IO under the mouse or -1
+        self.hoverIO = -1
+        #Repaints the node only when (self.hover, self.hoverIO) changes
+        self.hoverState = HoverTracker(self, (False, -1))
         #Add 2x IO ('left' = left, 'right' = right /,/ 0 = neutral, 1 = input, 2 is output)
         self.addNewIO('left', 0)
         self.addNewIO('right', 0)
@@ -93,35 +121,33 @@ class Node(QGraphicsItem):
 
     def paintNodeIO(self, painter, lod):
         #Draw all IO
-        for i in range(0, len(self.ioList)):
+        for i, io in enumerate(self.ioList):
             #Center io if one side contains less io
             yTranslation = 0
-            if self.ioList[i][3] == 'left':
+            if io.side == 'left':
                 yTranslation = self.yTranslationLeftIO
             else:
                 yTranslation = self.yTranslationRightIO
 
-            # self.ioList[i][4] is state of socket: 0 neutral 1 input 2 output
-            # self.ioList[i][5]: is hover
             painter.setPen(schemastyle.SOCKET_NEUTRAL_COLOR)
             brush = QBrush(schemastyle.SOCKET_NEUTRAL_COLOR)
             painter.setBrush(brush)
 
             #Don't paint neutral IO if disabled
-            if self.ioList[i][4] != 0:
-                if self.ioList[i][3] == 'left':
-                    rect = QRect(self.ioList[i][0] + 5, self.ioList[i][1] + yTranslation + 1, self.ioWidth-2, self.ioHeight-2)
+            if io.ioType != 0:
+                if io.side == 'left':
+                    rect = QRect(io.x + 5, io.y + yTranslation + 1, self.ioWidth-2, self.ioHeight-2)
                 else:
-                    rect = QRect(self.ioList[i][0] - 5, self.ioList[i][1] + yTranslation + 1, self.ioWidth-2, self.ioHeight-2)
+                    rect = QRect(io.x - 5, io.y + yTranslation + 1, self.ioWidth-2, self.ioHeight-2)
                 painter.drawEllipse(rect)
 
                 #Paint IO name
                 if lod > 0.4:
                     painter.setFont(QFont("Arial", 6))
-                    if self.ioList[i][3] == 'left':
-                        painter.drawText(self.getIONameRect(i, yTranslation, self.ioList[i][3]), Qt.AlignLeft, str(self.ioList[i][6]))
+                    if io.side == 'left':
+                        painter.drawText(self.getIONameRect(i, yTranslation, io.side), Qt.AlignLeft, str(io.name))
                     else:
-                        painter.drawText(self.getIONameRect(i, yTranslation, self.ioList[i][3]), Qt.AlignRight, str(self.ioList[i][6]))
+                        painter.drawText(self.getIONameRect(i, yTranslation, io.side), Qt.AlignRight, str(io.name))
 
         painter.setPen(Qt.black)
 
@@ -177,13 +203,15 @@ class Node(QGraphicsItem):
             if not posChange.isNull():
                 self.moveEdges(posChange)
                 self.lastPos = newPos
+        elif change == QGraphicsItem.ItemPositionHasChanged and self.scene() is not None:
+            self.scene().itemMoved(self)
 
         return super(Node, self).itemChange(change, newPos)
 
     def snapToGrid(self, position):
         #Return position of closest grid point
-        gridSizeX = 40
-        gridSizeY = 10
+        gridSizeX = Node.GRID_X_RES
+        gridSizeY = Node.GRID_Y_RES
         curPos = QPoint(position.x(), position.y())
         gridPos = QPoint(round(curPos.x() / gridSizeX) * gridSizeX, round(curPos.y() / gridSizeY) * gridSizeY)
 
@@ -202,7 +230,6 @@ class Node(QGraphicsItem):
             self.mouseIsOnIO(event.pos())
 
         super().hoverMoveEvent(event)
-        self.update()
 
         #Must be done after super().mousePressEvent(event) in order to
         #flag the node again after clicking on an input/output
@@ -210,17 +237,17 @@ class Node(QGraphicsItem):
         self.setFlag(QGraphicsItem.ItemIsMovable, True)
 
     def hoverEnterEvent(self, event):
-        self.setCursor(Qt.PointingHandCursor)
-        super().hoverEnterEvent(event)
-        self.update()
+        self.hoverState.setCursor(Qt.PointingHandCursor)
+        #Not calling super(), the hover tracker repaints when entering on an IO
+        if not QGraphicsItem.isSelected(self):
+            self.mouseIsOnIO(event.pos())
 
     def hoverLeaveEvent(self, event):
         self.hover = False
         self.setHoveringToFalse()
-        self.setCursor(Qt.ArrowCursor)
-
-        super().hoverLeaveEvent(event)
-        self.update()
+        #Not calling super(), the hover tracker repaints already
+        self.hoverState.setTarget((self.hover, self.hoverIO))
+        self.hoverState.setCursor(Qt.ArrowCursor)
     
     def contextMenuEvent(self, event):
         print('node menu triggered')
@@ -261,68 +288,86 @@ class Node(QGraphicsItem):
 
         return ioPoint
 
-    def addNewIO(self, side, ioType):
+    def addNewIO(self, side, ioType, update = True):
         if side == 'left':
             i = self.getLengthLeftSide()
         else:
             i = self.getLengthRightSide()
 
-        #---newIO = (ioPoint.x, ioPoint.y, hasEdge, side, ioType, mouseHover, name)---
-        newIO = (self.getIOPoint(i, side).x(), self.getIOPoint(i, side).y(), False, side, ioType, False, '')
-        self.ioList.append(newIO)
+        ioPoint = self.getIOPoint(i, side)
+        self.ioSides[side].append(len(self.ioList))
+        self.ioList.append(NodeIO(ioPoint.x(), ioPoint.y(), False, side, ioType, False, ''))
 
-        #Update the nodeBodyHeight
-        self.updateNode()
+        #Update the nodeBodyHeight, unless the caller does so after adding more IO
+        if update:
+            self.updateNode()
         
     def setIOType(self, side, ioType, name):    
         #Update the type paramater of the IO
-        i = self.getLastIOSide(side)
-
-        self.ioList.insert(i, (self.ioList[i][0], self.ioList[i][1], self.ioList[i][2], self.ioList[i][3], ioType, self.ioList[i][5], name))
-        del self.ioList[i + 1]
+        io = self.ioList[self.getLastIOSide(side)]
+        io.ioType = ioType
+        io.name = name
 
     def mouseIsOnIO(self, mousePos, click = False):    	
     	#Returns the IO that the mouse is on
-        for i in range(0, len(self.ioList)):
-            #Adjust if IO is centered on a side
-            if self.ioList[i][3] == 'left':
-                yTranslation = self.yTranslationLeftIO
-            else:
-                yTranslation = self.yTranslationRightIO
-
-            #Get point of IO
-            IOPoint = QPointF(self.ioList[i][0], self.ioList[i][1] + yTranslation)
-
-            #If mouse is over IO -> return IO
-            if mousePos.x() > IOPoint.x() and mousePos.x() < IOPoint.x() + self.ioWidth:
-                if mousePos.y() > IOPoint.y() and mousePos.y() < IOPoint.y() + self.ioHeight:
-                    # entry point for drawing graphs.......
-                    # if click:
-                    #     print('mouse on IO: ' + str(i) + ' (' + str(self.ioList[i][3]) + ', ' + str(self.ioList[i][4]) + ')')
-                    
-                    #Update the hover paramater of the IO
-                    self.ioList.insert(i, (self.ioList[i][0], self.ioList[i][1], self.ioList[i][2], self.ioList[i][3], self.ioList[i][4], True, self.ioList[i][6]))
-                    del self.ioList[i + 1]
-
-                    self.setFlag(QGraphicsItem.ItemIsSelectable, False)
-                    self.setFlag(QGraphicsItem.ItemIsMovable, False)
-                    self.hover = False
-                    return i
-        #If no IO is found under the mouse -> make sure hovering is enabled and return -1
-        self.hover = True
-        self.setHoveringToFalse()
+        i = self.ioAt(mousePos)
+        if i >= 0:
+            # entry point for drawing graphs.......
+            # if click:
+            #     print('mouse on IO: ' + str(i) + ' (' + str(self.ioList[i].side) + ', ' + str(self.ioList[i].ioType) + ')')
+
+            #Update the hover paramater of the IO
+            self.setHoveringToFalse()
+            self.ioList[i].hover = True
+            self.hoverIO = i
+
+            self.setFlag(QGraphicsItem.ItemIsSelectable, False)
+            self.setFlag(QGraphicsItem.ItemIsMovable, False)
+            self.hover = False
+        else:
+            #If no IO is found under the mouse -> make sure hovering is enabled and return -1
+            self.hover = True
+            self.setHoveringToFalse()
+
+        #Only repaint when the hovered IO or body changed
+        self.hoverState.setTarget((self.hover, self.hoverIO))
+        return i
+
+    def ioAt(self, mousePos):
+        #Index of the IO under mousePos or -1, the side follows from x and the
+        #row on that side from y
+        x = mousePos.x()
+        if x > 0 and x < self.ioWidth:
+            side = 'left'
+            yTranslation = self.yTranslationLeftIO
+        elif x > self.nodeBodyWidth - self.ioWidth and x < self.nodeBodyWidth:
+            side = 'right'
+            yTranslation = self.yTranslationRightIO
+        else:
+            return -1
+
+        ioY = mousePos.y() - yTranslation - self.ioHeight / 2
+        row = int(ioY // (self.ioHeightDifference + self.ioHeight))
+        if row < 0 or row >= len(self.ioSides[side]):
+            return -1
+        #Only the IO itself, not the space below it
+        if ioY - row * (self.ioHeightDifference + self.ioHeight) > 0 and \
+            ioY - row * (self.ioHeightDifference + self.ioHeight) < self.ioHeight:
+            return self.ioSides[side][row]
         return -1
 
     def setHoveringToFalse(self):
-        for i in range(0, len(self.ioList)):
-        	#Set all hover parameters to false
-            self.ioList.insert(i, (self.ioList[i][0], self.ioList[i][1], self.ioList[i][2], self.ioList[i][3], self.ioList[i][4], False, self.ioList[i][6]))
-            del self.ioList[i + 1]
+        #Only one IO is hovered at a time
+        if self.hoverIO >= 0:
+            self.ioList[self.hoverIO].hover = False
+            self.hoverIO = -1
 
 
     def updateNode(self):
     	#Update the dimentional values of the node and its IO
         self.calculateNodeBodyHeight()
+        if self.scene() is not None:
+            self.scene().itemMoved(self)
 
     def calculateNodeBodyHeight(self):
         #Get how many inputs/outputs are on each side
@@ -346,24 +391,16 @@ class Node(QGraphicsItem):
     	return self.nodeBodyHeight
 
     def getLengthLeftSide(self):
-        countSides = Counter(elem[3] for elem in self.ioList)
-
-        return countSides['left']
+        return len(self.ioSides['left'])
 
     def getLengthRightSide(self):
-        countSides = Counter(elem[3] for elem in self.ioList)
-        
-        return countSides['right']
+        return len(self.ioSides['right'])
 
     def getLastIOSide(self, side):
     	#Returns the index of the last IO on a side
-        ioIndex = 0
-        for i in reversed(range(len(self.ioList))):
-            if side in self.ioList[i]:
-                ioIndex = i
-                break
-
-        return ioIndex
+        if self.ioSides[side]:
+            return self.ioSides[side][-1]
+        return 0
 
     def setNodeName(self):
     	#Determine the displayed name of the node and its location once
@@ -375,28 +412,30 @@ class Node(QGraphicsItem):
             self.nodeNameDisplayed += '..'
 
     def getRoundedRectPath(self, i, yTranslation, side):
-        rect = QRect(self.ioList[i][0], self.ioList[i][1] + yTranslation, self.ioWidth, self.ioHeight, 2, 2)
+        io = self.ioList[i]
+        rect = QRect(io.x, io.y + yTranslation, self.ioWidth, self.ioHeight, 2, 2)
 
         path = QPainterPath();
         path.setFillRule(Qt.WindingFill);
         
-        path.addRoundedRect(self.ioList[i][0], self.ioList[i][1] + yTranslation, self.ioWidth, self.ioHeight, 2, 2)
+        path.addRoundedRect(io.x, io.y + yTranslation, self.ioWidth, self.ioHeight, 2, 2)
         
         #Remove rounded edges on left or right side
         if side == 'left':
-            path.addRect(self.ioList[i][0], self.ioList[i][1] + yTranslation, 2, 2)
-            path.addRect(self.ioList[i][0], self.ioList[i][1] + yTranslation + self.ioHeight - 2, 2, 2)
+            path.addRect(io.x, io.y + yTranslation, 2, 2)
+            path.addRect(io.x, io.y + yTranslation + self.ioHeight - 2, 2, 2)
         else:
-            path.addRect(self.ioList[i][0] + self.ioWidth - 2, self.ioList[i][1] + yTranslation, 2, 2)
-            path.addRect(self.ioList[i][0] + self.ioWidth - 2, self.ioList[i][1] + yTranslation + self.ioHeight - 2, 2, 2)
+            path.addRect(io.x + self.ioWidth - 2, io.y + yTranslation, 2, 2)
+            path.addRect(io.x + self.ioWidth - 2, io.y + yTranslation + self.ioHeight - 2, 2, 2)
 
         return path
 
     def getIONameRect(self, i, yTranslation, side):
+        io = self.ioList[i]
         if side == 'left':
-            rect = QRectF(self.ioList[i][0] + self.ioWidth + 2, self.ioList[i][1] + yTranslation, self.ioWidth, self.ioHeight)
+            rect = QRectF(io.x + self.ioWidth + 2, io.y + yTranslation, self.ioWidth, self.ioHeight)
         else:
-            rect = QRectF(self.ioList[i][0] - self.ioWidth - 2, self.ioList[i][1] + yTranslation, self.ioWidth, self.ioHeight)
+            rect = QRectF(io.x - self.ioWidth - 2, io.y + yTranslation, self.ioWidth, self.ioHeight)
 
         return rect
 
@@ -406,16 +445,23 @@ class Node(QGraphicsItem):
         self.edgeList.append(newEdge)
 
     def moveEdges(self, posChange, side = 'both'):
-        #Move edges connected to node
-        if len(self.edgeList) > 0:
-            for i in range(len(self.edgeList)):
-                if 'begin' in self.edgeList[i]:
-                    #Only move edge side if the entire edge is moved or the specified side is moved
-                    if side == 'both' or side == self.ioList[i][3]:
-                        self.edgeList[i][0].moveEdge(posChange, 'begin')
-                else:
-                    if side == 'both' or side == self.ioList[i][3]:
-                        self.edgeList[i][0].moveEdge(posChange, 'end')
+        #Move edges connected to node, their curves are updated at once
+        movedEdges = OrderedDict()
+        for i in range(len(self.edgeList)):
+            edge = self.edgeList[i][0]
+            if 'begin' in self.edgeList[i]:
+                #Only move edge side if the entire edge is moved or the specified side is moved
+                if side == 'both' or side == self.ioList[i].side:
+                    edge.moveEdge(posChange, 'begin', False)
+                    movedEdges[edge] = True
+            else:
+                if side == 'both' or side == self.ioList[i].side:
+                    edge.moveEdge(posChange, 'end', False)
+                    movedEdges[edge] = True
+
+        updateEdgeCurves(movedEdges)
+        for edge in movedEdges:
+            edge.edgeMoved()
 
     def setZValueEdges(self, zValue):
         for i in range(len(self.edgeList)):
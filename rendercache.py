@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared cache of pre-rendered pixmaps of scene items
+
+Painting a component or socket means setting up brushes and fonts and laying
+out text. Items with the same appearance look exactly the same, so they are
+painted once into a pixmap which is then reused by all of them. Text that
+differs per item, like the name of a component, is kept as a QStaticText so
+it is laid out only once.
+
+A pixmap is rendered for a scale bucket, the power of two at or above the
+level of detail of the view, so zooming in a bit does not make the pixmaps
+blurry. Beyond MAX_SCALE items are painted directly.
+
+The key of a pixmap must describe everything that determines the looks of an
+item. Changing the style therefore has to be followed by styleChanged(),
+which drops all pixmaps.
+
+author: Rinse Wester
+
+"""
+
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QPixmap, QPainter, QStaticText
+
+# Scales for which pixmaps are rendered. Zoomed in further the pixmaps get
+# large and drawing them is not faster than painting the items directly,
+# see benchmarks/bench_paint.py
+MIN_SCALE = 0.5
+MAX_SCALE = 2.0
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+# Estimated memory used by a QStaticText per character and in total
+STATIC_TEXT_CHAR_BYTES = 64
+STATIC_TEXT_BYTES = 256
+
+
+def scaleBucket(lod):
+    """
+    Returns the scale at which to render for a level of detail, or None when
+    the item should be painted directly.
+    """
+    if lod > MAX_SCALE:
+        return None
+    return max(MIN_SCALE, 2.0 ** math.ceil(math.log2(lod)))
+
+
+class RenderCache(object):
+    """
+    Least recently used cache of pixmaps and static texts with a bound on
+    their total size.
+
+    Parameters
+    ----------
+    maxBytes : maximum memory used by the cached objects, counted as 4 bytes
+        per pixel for pixmaps and estimated for static texts
+    """
+
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES):
+        self.maxBytes = maxBytes
+        self.enabled = True
+        # key -> (object, nbytes)
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def pixmap(self, key, rect, scale, render):
+        """
+        Returns the pixmap for key, rendering it when it is not cached.
+
+        Parameters
+        ----------
+        key : hashable description of the looks of the item
+        rect : bounding rectangle of the item in item coordinates
+        scale : scale bucket as returned by scaleBucket()
+        render : callable render(painter) painting the item in item coordinates
+        """
+        fullKey = ('pixmap', key, scale)
+        entry = self.entries.get(fullKey)
+        if entry is not None:
+            self.entries.move_to_end(fullKey)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        pm = QPixmap(int(math.ceil(rect.width() * scale)), int(math.ceil(rect.height() * scale)))
+        pm.fill(Qt.transparent)
+        painter = QPainter(pm)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setRenderHint(QPainter.TextAntialiasing, True)
+        painter.scale(scale, scale)
+        painter.translate(-rect.x(), -rect.y())
+        render(painter)
+        painter.end()
+
+        self._add(fullKey, pm, pm.width() * pm.height() * 4)
+        return pm
+
+    def staticText(self, text):
+        """
+        Returns a QStaticText for text.
+        """
+        key = ('text', text)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        st = QStaticText(text)
+        st.setTextFormat(Qt.PlainText)
+        self._add(key, st, STATIC_TEXT_BYTES + STATIC_TEXT_CHAR_BYTES * len(text))
+        return st
+
+    def drawCenteredText(self, painter, text, rect):
+        """
+        Draws text centered in rect using a cached QStaticText.
+        """
+        if not self.enabled:
+            painter.drawText(rect, Qt.AlignCenter, text)
+            return
+        st = self.staticText(text)
+        size = st.size()
+        painter.drawStaticText(QPointF(rect.center().x() - size.width() / 2,
+            rect.center().y() - size.height() / 2), st)
+
+    def paint(self, painter, key, rect, lod, render):
+        """
+        Paints an item with a cached pixmap, or directly by calling render
+        when the cache is disabled or the view is zoomed in beyond MAX_SCALE.
+        """
+        scale = scaleBucket(lod)
+        if not self.enabled or scale is None:
+            render(painter)
+            return
+        pm = self.pixmap(key, rect, scale, render)
+        painter.drawPixmap(QRectF(rect.x(), rect.y(), pm.width() / scale, pm.height() / scale), pm, QRectF(pm.rect()))
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def _add(self, key, obj, nbytes):
+        self.entries[key] = (obj, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.maxBytes and len(self.entries) > 1:
+            _, (_, oldBytes) = self.entries.popitem(last=False)
+            self.nbytes -= oldBytes
+
+
+renderCache = RenderCache()
+
+
+def styleChanged():
+    """
+    Drops all pixmaps, call this after changing anything in schemastyle.
+    """
+    renderCache.clear()
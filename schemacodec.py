@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Transparent compression of schematic files
+
+A codec is selected by the magic bytes at the start of a file when reading
+and by the extension of the file name when writing. Data is always streamed
+through the codec, the complete decompressed text is never held in memory.
+
+New codecs can be added with registerCodec().
+
+author: Rinse Wester
+
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Codec(object):
+    """
+    Compression codec for schematic files.
+
+    Parameters
+    ----------
+    name : name of the codec
+    extensions : tuple of file name extensions, like ('.gz',)
+    magic : bytes at the start of every compressed file
+    reader : callable reader(rawfile) returning a binary file object from
+        which the decompressed data is read
+    writer : callable writer(rawfile, level) returning a binary file object
+        to which the uncompressed data is written. Closing it must finish the
+        compressed stream but leave rawfile open.
+    defaultLevel : compression level used when no level is given
+    """
+
+    def __init__(self, name, extensions, magic, reader, writer, defaultLevel):
+        self.name = name
+        self.extensions = extensions
+        self.magic = magic
+        self.reader = reader
+        self.writer = writer
+        self.defaultLevel = defaultLevel
+
+    @contextmanager
+    def textReader(self, rawfile):
+        stream = self.reader(rawfile)
+        text = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
+            yield text
+        finally:
+            text.detach()
+            stream.close()
+
+    @contextmanager
+    def textWriter(self, rawfile, level=None):
+        if level is None:
+            level = self.defaultLevel
+        stream = self.writer(rawfile, level)
+        text = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
+            yield text
+        finally:
+            text.flush()
+            text.detach()
+            stream.close()
+
+
+class PlainCodec(Codec):
+    """
+    Codec for uncompressed files: the raw file is used as is.
+    """
+
+    def __init__(self):
+        super().__init__('plain', (), b'', None, None, None)
+
+    @contextmanager
+    def textReader(self, rawfile):
+        text = io.TextIOWrapper(rawfile, encoding='utf-8')
+        try:
+            yield text
+        finally:
+            text.detach()
+
+    @contextmanager
+    def textWriter(self, rawfile, level=None):
+        text = io.TextIOWrapper(rawfile, encoding='utf-8')
+        try:
+            yield text
+        finally:
+            text.flush()
+            text.detach()
+
+
+PLAIN = PlainCodec()
+
+codecs = OrderedDict()
+
+
+def registerCodec(codec):
+    """
+    Adds a codec, or replaces the codec with the same name.
+    """
+    codecs[codec.name] = codec
+
+
+def codecForName(name):
+    """
+    Returns the codec with the given name.
+
+    Raises
+    ------
+    ValueError
+        When there is no codec with this name.
+    """
+    if name == PLAIN.name:
+        return PLAIN
+    if name not in codecs:
+        raise ValueError('Unknown compression codec ' + name)
+    return codecs[name]
+
+
+def codecForFilename(filename):
+    """
+    Returns the codec belonging to the extension of filename, PLAIN when the
+    extension is not known.
+    """
+    lowername = filename.lower()
+    for codec in codecs.values():
+        if lowername.endswith(codec.extensions):
+            return codec
+    return PLAIN
+
+
+def codecForFile(rawfile, filename=''):
+    """
+    Returns the codec of an open binary file based on its magic bytes, or
+    based on the extension of filename when the magic bytes are not known.
+    The file position is restored afterwards.
+    """
+    pos = rawfile.tell()
+    head = rawfile.read(8)
+    rawfile.seek(pos)
+    for codec in codecs.values():
+        if head.startswith(codec.magic):
+            return codec
+    return codecForFilename(filename)
+
+
+registerCodec(Codec('gzip', ('.gz', '.gzip'), b'\x1f\x8b',
+    lambda f: gzip.GzipFile(fileobj=f, mode='rb'),
+    lambda f, level: gzip.GzipFile(fileobj=f, mode='wb', compresslevel=level, mtime=0),
+    6))
+
+registerCodec(Codec('bzip2', ('.bz2',), b'BZh',
+    lambda f: bz2.BZ2File(f, 'rb'),
+    lambda f, level: bz2.BZ2File(f, 'wb', compresslevel=level),
+    9))
+
+registerCodec(Codec('xz', ('.xz', '.lzma'), b'\xfd7zXZ\x00',
+    lambda f: lzma.LZMAFile(f, 'rb'),
+    lambda f, level: lzma.LZMAFile(f, 'wb', preset=level),
+    6))
+
+if zstandard is not None:
+    registerCodec(Codec('zstd', ('.zst', '.zstd'), b'\x28\xb5\x2f\xfd',
+        lambda f: zstandard.ZstdDecompressor().stream_reader(f, closefd=False),
+        lambda f, level: zstandard.ZstdCompressor(level=level).stream_writer(f, closefd=False),
+        3))
@@ -11,6 +11,7 @@ GRID_Y_RES = 10
 COMPONENT_BACKGROUND_COLOR = QColor(77, 77, 77)
 COMPONENT_SHADOW_COLOR = QColor(48, 48, 48)
 COMPONENT_TEXT_COLOR = QColor(255, 255, 255)
+COMPONENT_OVERVIEW_COLOR = QColor(110, 110, 110)
 
 SOCKET_NAME_COLOR = QColor(255, 255, 255)
 SOCKET_NEUTRAL_COLOR = QColor(164, 164,164)
@@ -20,3 +21,37 @@ LINK_COLOR = SOCKET_NEUTRAL_COLOR
 LINK_BLUE_COLOR = QColor(114, 166, 247)
 LINK_GREEN_COLOR = QColor(114, 247, 166)
 
+# Distance from the connection point of a socket within which a click hits it
+SOCKET_HIT_RADIUS = 15
+# Distance within which a new link snaps to a free socket
+SOCKET_SNAP_RADIUS = 30
+# Distance from a link within which the mouse hovers it
+LINK_HIT_RADIUS = 4
+
+# Level of detail tiers, from all details to an overview. The level of detail
+# is the scale at which the view shows the scene.
+LOD_TIER_FULL = 0       # everything
+LOD_TIER_MEDIUM = 1     # sockets as dots without names
+LOD_TIER_LOW = 2        # no sockets, links as straight lines, plain components
+LOD_TIER_OVERVIEW = 3   # components as filled cells, links as a density layer
+
+# Lowest level of detail at which each tier is used, below LOD_LOW_MIN the
+# overview tier is used
+LOD_FULL_MIN = 0.7
+LOD_MEDIUM_MIN = 0.4
+LOD_LOW_MIN = 0.15
+
+# Size of the cells of the link density layer in scene coordinates
+LINK_DENSITY_CELL_SIZE = 100
+LINK_DENSITY_COLOR = QColor(164, 164, 164)
+
+
+def lodTier(lod):
+    if lod >= LOD_FULL_MIN:
+        return LOD_TIER_FULL
+    elif lod >= LOD_MEDIUM_MIN:
+        return LOD_TIER_MEDIUM
+    elif lod >= LOD_LOW_MIN:
+        return LOD_TIER_LOW
+    else:
+        return LOD_TIER_OVERVIEW
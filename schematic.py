@@ -4,8 +4,60 @@
 
 import networkx as nx
 import json
+import os
 import string
-from collections import OrderedDict
+from collections import namedtuple
+from jsonstream import JSONStreamReader
+from atomicfile import openAtomic
+import schemacodec
+import schematicbin
+
+# Nr of records collected before they are added to the graph in bulk
+BULK_SIZE = 4096
+
+# Size of the buffer used when writing schematic files
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Kinds of issues found by Schematic.validate()
+DUPLICATE_COMPONENT = 'duplicate component'
+DUPLICATE_SOCKET = 'duplicate socket'
+DANGLING_ENDPOINT = 'dangling endpoint'
+MULTIPLE_LINKS = 'multiple links'
+WRONG_SIDE = 'wrong side'
+
+# Issue of the validation: severity is either 'error' or 'warning'
+ValidationIssue = namedtuple('ValidationIssue', ['kind', 'severity', 'component', 'socket', 'message'])
+
+
+class ValidationReport(object):
+    """
+    Result of Schematic.validate(): a list of issues found in the schematic.
+
+    When the validation stopped early because the maximum number of errors was
+    reached, truncated is True.
+    """
+
+    def __init__(self):
+        self.issues = []
+        self.truncated = False
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == 'error']
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == 'warning']
+
+    @property
+    def valid(self):
+        return all(issue.severity != 'error' for issue in self.issues)
+
+    def __str__(self):
+        lines = ['{}: {}'.format(issue.severity, issue.message) for issue in self.issues]
+        if self.truncated:
+            lines.append('(validation stopped after {} errors)'.format(len(self.errors)))
+        return '\n'.join(lines)
 
 
 class Schematic(nx.MultiDiGraph):
@@ -19,7 +71,21 @@ class Schematic(nx.MultiDiGraph):
     def __init__(self):
         super().__init__()
 
-        # other init code for the schematics 
+        # Names of components that were added more than once, the graph itself
+        # only keeps the last one
+        self.duplicateComponents = []
+
+    def copy(self, as_view=False):
+        """
+        Returns a copy of the schematic. Unlike the copy of networkx it keeps
+        the file name and the duplicate components.
+        """
+        schem = super().copy(as_view=as_view)
+        if not as_view:
+            schem.duplicateComponents = list(self.duplicateComponents)
+            if hasattr(self, 'filename'):
+                schem.filename = self.filename
+        return schem
 
     def add_link(self, src, dst, srcoutp, dstinp, name=''):
         """
@@ -41,10 +107,12 @@ class Schematic(nx.MultiDiGraph):
         if dst not in self.nodes():
             raise ValueError('No source component named ' + dst + ' in schematic')
 
-        if srcoutp not in (self.node[src]['leftsockets'] + self.node[src]['rightsockets']):
+        srcattr = self.node[src]
+        if srcoutp not in srcattr['leftsockets'] and srcoutp not in srcattr['rightsockets']:
             raise ValueError('No socket named ' + srcoutp + ' for source node ' + src)
 
-        if dstinp not in (self.node[dst]['leftsockets'] + self.node[dst]['rightsockets']):
+        dstattr = self.node[dst]
+        if dstinp not in dstattr['leftsockets'] and dstinp not in dstattr['rightsockets']:
             raise ValueError('No socket named ' + dstinp + ' for destination node ' + dst)
 
         if name == '':
@@ -52,8 +120,54 @@ class Schematic(nx.MultiDiGraph):
         else:
             linkName = name
 
-        super().add_edge(src, dst, srcoutp=srcoutp, dstinp=dstinp, name=linkName)
+        return super().add_edge(src, dst, srcoutp=srcoutp, dstinp=dstinp, name=linkName)
+
+    def add_links_bulk(self, links):
+        """
+        Add many links to the schematic at once.
+
+        The sockets of every component are indexed once per call, so checking
+        the endpoints of a link takes constant time regardless of the number of
+        sockets of a component. The components must already be present.
+
+        Parameters
+        ----------
+        links : iterable of (src, dst, srcoutp, dstinp) or
+            (src, dst, srcoutp, dstinp, name) tuples. Columnar data can be passed
+            as zip(srcs, dsts, srcoutps, dstinps).
 
+        Raises
+        ------
+        ValueError
+            When a link refers to an unknown component or socket. Links before
+            the offending one have been added already.
+        """
+        nodes = self.node
+        socketSets = {}
+
+        def sockets(comp, role):
+            compSockets = socketSets.get(comp)
+            if compSockets is None:
+                if comp not in nodes:
+                    raise ValueError('No ' + role + ' component named ' + comp + ' in schematic')
+                compattr = nodes[comp]
+                compSockets = socketSets[comp] = set(compattr['leftsockets']).union(compattr['rightsockets'])
+            return compSockets
+
+        def edges():
+            for link in links:
+                src, dst, srcoutp, dstinp = link[:4]
+                if srcoutp not in sockets(src, 'source'):
+                    raise ValueError('No socket named ' + srcoutp + ' for source node ' + src)
+                if dstinp not in sockets(dst, 'destination'):
+                    raise ValueError('No socket named ' + dstinp + ' for destination node ' + dst)
+                if len(link) > 4 and link[4] != '':
+                    linkName = link[4]
+                else:
+                    linkName = "{}.{}>{}.{}".format(src, srcoutp, dst, dstinp)
+                yield src, dst, {'srcoutp': srcoutp, 'dstinp': dstinp, 'name': linkName}
+
+        super().add_edges_from(edges())
 
     def add_component(self, name, leftsockets=[], rightsockets=[], pos=(0,0)):
         """
@@ -68,15 +182,95 @@ class Schematic(nx.MultiDiGraph):
         leftsockets: list of names for sockets to which a link can be connected, shown on the left side of component
         rightsockets: similar to leftsockets except shown on the right side of component
         """
+        if name in self.node:
+            self.duplicateComponents.append(name)
         super().add_node(name, leftsockets=leftsockets, rightsockets=rightsockets, pos=pos)
 
-    def loadFromFile(self, filename):
+    def add_components_bulk(self, components):
+        """
+        Add many components to the schematic at once.
+
+        Parameters
+        ----------
+        components : iterable of (name, leftsockets, rightsockets, pos) tuples.
+            Columnar data can be passed as zip(names, leftsockets, rightsockets, positions).
+        """
+        nodes = self.node
+        duplicates = self.duplicateComponents
+
+        def records():
+            for name, leftsockets, rightsockets, pos in components:
+                if name in nodes:
+                    duplicates.append(name)
+                yield name, {'leftsockets': leftsockets, 'rightsockets': rightsockets, 'pos': pos}
+
+        super().add_nodes_from(records())
+
+    @classmethod
+    def from_records(cls, components, links=()):
+        """
+        Creates a new schematic from component and link records.
+
+        Parameters
+        ----------
+        components : iterable of records as accepted by add_components_bulk()
+        links : iterable of records as accepted by add_links_bulk()
+        """
+        schem = cls()
+        schem.add_components_bulk(components)
+        schem.add_links_bulk(links)
+        return schem
+
+    @classmethod
+    def from_file(cls, filename, progress=None, cache=None):
+        """
+        Creates a new schematic from a JSON file, see loadFromFile().
+
+        Parameters
+        ----------
+        filename : string with file path
+        progress : optional callable called as progress(bytesread, filesize)
+            while the file is read
+        cache : optional SchematicCache. When the file is in the cache the
+            schematic is taken from the cache, otherwise it is added to the
+            cache after loading.
+
+        Raises
+        ------
+        ValueError
+            When the schematic is inconsistent as detected by the validate() method.
+        """
+        if cache is not None:
+            cacheKey = cache.key(filename)
+            schem = cache.load(cacheKey)
+            if schem is not None:
+                schem.filename = filename
+                if progress is not None:
+                    filesize = cacheKey.stat.st_size
+                    progress(filesize, filesize)
+                return schem
+
+        schem = cls()
+        schem.loadFromFile(filename, progress=progress)
+        if cache is not None:
+            cache.store(schem, cacheKey)
+        return schem
+
+    def loadFromFile(self, filename, progress=None):
         """
         Loads a schematic from a JSON file.
 
+        The file is parsed incrementally: every component and link is added to
+        the schematic as soon as it is read, so memory use is bounded by the
+        largest single record instead of the size of the file. Compressed files
+        (see schemacodec) are detected by their magic bytes or extension and
+        decompressed on the fly.
+
         Parameters
         ----------
         filename : string with file path
+        progress : optional callable called as progress(bytesread, filesize)
+            while the file is read
 
         Raises
         ------
@@ -84,39 +278,81 @@ class Schematic(nx.MultiDiGraph):
             When the schematic is inconsistent as detected by the validate() method.
         """
         self.filename = filename
-        with open(filename, 'r') as f:
-            jsonstr = f.read()
-
-        jsondata = json.loads(jsonstr)
-
-        # Load all components and their attributes
-        for jscomp in jsondata['components']:
-            compName = jscomp['name']
-            compPos = jscomp.get('pos', (0, 0))
-            leftsockets = jscomp.get('leftsockets', [])
-            rightsockets = jscomp.get('rightsockets', [])
-            self.add_component(compName, leftsockets=leftsockets, rightsockets=rightsockets, pos=compPos)
-
-        # Load all links and their attributes
-        # TODO: add thickness property
-        for jslink in jsondata['links']:
-            sourceComp, sourceSocket = jslink['src'].split('.')
-            destinationComp, destinationSocket = jslink['dst'].split('.')
-            self.add_link(sourceComp, destinationComp, sourceSocket, destinationSocket)
+        filesize = os.path.getsize(filename)
+        with open(filename, 'rb') as rawfile, schemacodec.codecForFile(rawfile, filename).textReader(rawfile) as f:
+            if progress is None:
+                reader = JSONStreamReader(f)
+            else:
+                reader = JSONStreamReader(f, progress=lambda _: progress(rawfile.tell(), filesize))
+
+            # Records are collected in batches and added in bulk. Links that
+            # appear before the components are complete are kept until all
+            # components are known
+            components = []
+            links = []
+            componentsSeen = False
+            for key, record in reader.events():
+                if key == 'components':
+                    # Load a component and its attributes
+                    components.append((record['name'], record.get('leftsockets', []),
+                        record.get('rightsockets', []), record.get('pos', (0, 0))))
+                    componentsSeen = True
+                    if len(components) >= BULK_SIZE:
+                        self.add_components_bulk(components)
+                        components.clear()
+
+                elif key == 'links':
+                    # Load a link and its attributes
+                    # TODO: add thickness property
+                    if components:
+                        self.add_components_bulk(components)
+                        components.clear()
+                    links.append(self._linkRecord(record))
+                    if componentsSeen and len(links) >= BULK_SIZE:
+                        self.add_links_bulk(links)
+                        links.clear()
+
+            self.add_components_bulk(components)
+            self.add_links_bulk(links)
+
+        if progress is not None:
+            progress(filesize, filesize)
 
         # Now that the schematic is construcuted, validate it:
-        self.validate()
-            
-    def storeToFile(self, filename=''):
+        report = self.validate()
+        if not report.valid:
+            raise ValueError('Inconsistent schematic ' + filename + ':\n' + str(report))
+
+    @staticmethod
+    def _linkRecord(jslink):
+        sourceComp, sourceSocket = jslink['src'].split('.')
+        destinationComp, destinationSocket = jslink['dst'].split('.')
+        return sourceComp, destinationComp, sourceSocket, destinationSocket
+
+    def storeToFile(self, filename='', compact=False, compressLevel=None, codec=None, progress=None):
         """
         Stores the current schematic in a JSON file.
 
+        Components and links are written one by one straight from the graph
+        into a temporary file, which replaces the destination file once it is
+        complete. The file is compressed when its extension belongs to one of
+        the codecs in schemacodec, like .gz or .xz.
+
         Parameters
         ----------
         filename : string with filepath
             filename is an optional argument containing the file in which schematic is stored.
             When this argument is not used, the schematic is stored in the file from which it
             was initially read.
+        compact : boolean, when True the JSON is written without indentation
+            and whitespace
+        compressLevel : optional compression level, the default level of the
+            codec is used when not given
+        codec : optional name of the compression codec, overrides the codec
+            selected by the extension of the file name
+        progress : optional callable called as progress(recordswritten, nrofrecords)
+            while the file is written. When it raises an exception, the
+            destination file is left untouched.
         """
         if filename == '':
             # no file name given so use file from which this schematic is made
@@ -124,44 +360,181 @@ class Schematic(nx.MultiDiGraph):
         else:
             fname = filename
 
-        # Put all info into a temporary dict which will be transformed into a json string
-        graphDict = OrderedDict({})
-        
-        # Store all the component of schematic in the temporary dict
-        components = []
-        for compName, compattr in self.nodes(data=True):
-            compdict = OrderedDict({})
-            compdict['name'] = compName
-            compdict['pos'] = compattr['pos']
-            if compattr['leftsockets'] != []:
-                compdict['leftsockets'] = compattr['leftsockets']
-            if compattr['rightsockets'] != []:
-                compdict['rightsockets'] = compattr['rightsockets']
-            components.append(compdict)
-
-        # add all components to temporary dict in form of a list
-        graphDict['components'] = components
-
-        # Store all the edges of the graph in the temporary dict
-        linkList = []
-        for srcname, dstname, connattr in self.edges(data=True):
-            linkdict = OrderedDict({})
-            linkdict['src'] = srcname + '.' + connattr['srcoutp']
-            linkdict['dst'] = dstname + '.' + connattr['dstinp']
-            linkList.append(linkdict)
+        if codec is None:
+            fileCodec = schemacodec.codecForFilename(fname)
+        else:
+            fileCodec = schemacodec.codecForName(codec)
 
-        # add all edges to temporary dict in form of a list
-        graphDict['links'] = linkList
+        with openAtomic(fname, 'wb', buffering=WRITE_BUFFER_SIZE) as rawfile, \
+                fileCodec.textWriter(rawfile, compressLevel) as outfile:
+            self.writeJSON(outfile, compact, progress)
 
-        # Last but not leat, write the graph to the file
-        with open(fname, 'w') as outfile:
-            json.dump(graphDict, outfile, indent=4)
+    def writeJSON(self, outfile, compact=False, progress=None):
+        """
+        Writes the schematic as JSON to an open text file.
 
-    def validate(self):
+        The indented output is identical to json.dump(..., indent=4) of the
+        complete schematic.
         """
-        Validates the schematic:
+        if compact:
+            encoder = json.JSONEncoder(separators=(',', ':'))
+            # separators and indentation of the document: start of document,
+            # start of list, between items, end of list, between lists, end
+            layout = ('{', '[', ',', ']', ',', '}')
+            recordIndent = ''
+        else:
+            encoder = json.JSONEncoder(indent=4)
+            layout = ('{\n    ', '[\n        ', ',\n        ', '\n    ]', ',\n    ', '\n}')
+            recordIndent = '\n        '
+        docStart, listStart, itemSep, listEnd, keySep, docEnd = layout
+
+        nrOfRecords = self.number_of_nodes() + self.number_of_edges()
+        written = 0
+
+        def writeList(key, records):
+            nonlocal written
+            outfile.write(encoder.encode(key) + (':' if compact else ': '))
+            first = True
+            for record in records:
+                outfile.write(listStart if first else itemSep)
+                text = encoder.encode(record)
+                if recordIndent:
+                    text = text.replace('\n', recordIndent)
+                outfile.write(text)
+                first = False
+                written += 1
+                if progress is not None and written % BULK_SIZE == 0:
+                    progress(written, nrOfRecords)
+            outfile.write('[]' if first else listEnd)
+
+        def components():
+            for compName, compattr in self.nodes(data=True):
+                compdict = {'name': compName, 'pos': compattr['pos']}
+                if compattr['leftsockets'] != []:
+                    compdict['leftsockets'] = compattr['leftsockets']
+                if compattr['rightsockets'] != []:
+                    compdict['rightsockets'] = compattr['rightsockets']
+                yield compdict
+
+        def links():
+            for srcname, dstname, connattr in self.edges(data=True):
+                yield {'src': srcname + '.' + connattr['srcoutp'], 'dst': dstname + '.' + connattr['dstinp']}
+
+        outfile.write(docStart)
+        writeList('components', components())
+        outfile.write(keySep)
+        writeList('links', links())
+        outfile.write(docEnd)
+        if progress is not None:
+            progress(nrOfRecords, nrOfRecords)
+
+    def loadFromBinaryFile(self, filename):
         """
-        print('Warning: schematic validate not yet implemented')
+        Loads a schematic from a binary schematic file (see schematicbin).
+
+        The file is memory mapped, no text is parsed.
+
+        Parameters
+        ----------
+        filename : string with file path
+
+        Raises
+        ------
+        ValueError
+            When the file is not a valid binary schematic or when the schematic
+            is inconsistent as detected by the validate() method.
+        """
+        schematicbin.readBinary(self, filename)
+
+        # Now that the schematic is construcuted, validate it:
+        report = self.validate()
+        if not report.valid:
+            raise ValueError('Inconsistent schematic ' + filename + ':\n' + str(report))
+
+    def storeToBinaryFile(self, filename):
+        """
+        Stores the current schematic in a binary schematic file (see schematicbin).
+
+        Parameters
+        ----------
+        filename : string with filepath
+        """
+        schematicbin.writeBinary(self, filename)
+
+    def validate(self, maxErrors=None):
+        """
+        Validates the schematic.
+
+        The following is checked, in time linear in the nr of components,
+        sockets and links:
+        - component names are unique (error)
+        - socket names are unique within a component (error)
+        - both endpoints of a link exist (error)
+        - every socket is connected to at most one link (error)
+        - links go from a right socket to a left socket (warning)
+
+        Parameters
+        ----------
+        maxErrors : optional nr of errors after which validation stops
+
+        Returns
+        -------
+        ValidationReport with all issues found
+        """
+        report = ValidationReport()
+        nrErrors = 0
+
+        def add(kind, severity, component, socket, message):
+            nonlocal nrErrors
+            report.issues.append(ValidationIssue(kind, severity, component, socket, message))
+            if severity == 'error':
+                nrErrors += 1
+                if maxErrors is not None and nrErrors >= maxErrors:
+                    report.truncated = True
+                    return True
+            return False
+
+        for compName in self.duplicateComponents:
+            if add(DUPLICATE_COMPONENT, 'error', compName, None,
+                    'Component ' + compName + ' is defined more than once'):
+                return report
+
+        # Side of every socket, indexed by (component, socket)
+        sides = {}
+        for compName, compattr in self.nodes(data=True):
+            for side in ('leftsockets', 'rightsockets'):
+                for sockName in compattr.get(side, ()):
+                    if (compName, sockName) in sides:
+                        if add(DUPLICATE_SOCKET, 'error', compName, sockName,
+                                'Socket ' + sockName + ' is defined more than once in component ' + compName):
+                            return report
+                    sides[compName, sockName] = side
+
+        # Nr of links connected to every socket
+        occupancy = {}
+        for srcname, dstname, connattr in self.edges(data=True):
+            for compName, sockName, expectedSide, role in ((srcname, connattr['srcoutp'], 'rightsockets', 'source'),
+                    (dstname, connattr['dstinp'], 'leftsockets', 'destination')):
+                endpoint = compName + '.' + sockName
+                side = sides.get((compName, sockName))
+                if side is None:
+                    if add(DANGLING_ENDPOINT, 'error', compName, sockName,
+                            'Link ' + connattr['name'] + ' has a dangling ' + role + ' ' + endpoint):
+                        return report
+                    continue
+
+                count = occupancy.get((compName, sockName), 0) + 1
+                occupancy[compName, sockName] = count
+                if count == 2:
+                    if add(MULTIPLE_LINKS, 'error', compName, sockName,
+                            'Socket ' + endpoint + ' is connected to more than one link'):
+                        return report
+
+                if side != expectedSide:
+                    add(WRONG_SIDE, 'warning', compName, sockName,
+                        'Link ' + connattr['name'] + ' has ' + role + ' ' + endpoint + ' on the wrong side')
+
+        return report
 
 if __name__ == '__main__':
     schem = Schematic()
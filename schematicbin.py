@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Compact binary container format for schematics
+
+A binary schematic file starts with a fixed size header followed by a number
+of sections. All numbers are little endian and every section starts on an 8
+byte boundary so it can be used directly from a memory mapped file.
+
+    header            magic, version, flags and the element counts
+    string offsets    uint32[nstrings + 1], offsets into the string data
+    string data       utf-8 encoded names of components and sockets
+    component names   uint32[ncomponents], index in the string table
+    positions         float64[2 * ncomponents], x and y of every component
+    socket start      uint32[ncomponents + 1], first socket of every component
+    left counts       uint32[ncomponents], nr of left sockets of every component
+    socket names      uint32[nsockets], index in the string table
+    links             4 x uint32[nlinks]: src comp, src socket, dst comp, dst socket
+
+Sockets of a component are stored left sockets first, followed by the right
+sockets. The socket numbers of a link are relative to its component.
+
+author: Rinse Wester
+
+"""
+
+import mmap
+import struct
+import sys
+import traceback
+from array import array
+
+MAGIC = b'SCHB'
+VERSION = 1
+
+# magic, version, flags, nstrings, stringbytes, ncomponents, nsockets, nlinks
+HEADER = struct.Struct('<4sHHIIIII')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _toLittleEndian(arr):
+    if sys.byteorder != 'little':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+def _fromLittleEndian(view, typecode):
+    # Zero copy view on little endian machines, swapped copy otherwise
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    arr = array(typecode, view.tobytes())
+    arr.byteswap()
+    return arr
+
+
+def _checkIndices(values, limit, what):
+    # Indices stored in the file must be below limit
+    if len(values) > 0 and max(values) >= limit:
+        raise ValueError('Binary schematic file has an invalid ' + what)
+
+
+def isBinarySchematic(filename):
+    """
+    Returns True when the file starts with the magic of the binary format.
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def writeBinary(schem, filename):
+    """
+    Stores a schematic in the binary format.
+
+    Parameters
+    ----------
+    schem : Schematic to store
+    filename : string with file path
+    """
+    strings = {}
+    stringOffsets = array('I', [0])
+    stringData = bytearray()
+
+    def intern(s):
+        idx = strings.get(s)
+        if idx is None:
+            idx = strings[s] = len(strings)
+            stringData.extend(s.encode('utf-8'))
+            stringOffsets.append(len(stringData))
+        return idx
+
+    compIndex = {}
+    compNames = array('I')
+    positions = array('d')
+    socketStart = array('I', [0])
+    leftCounts = array('I')
+    socketNames = array('I')
+    socketIndex = []
+
+    for compName, compattr in schem.nodes(data=True):
+        compIndex[compName] = len(compNames)
+        compNames.append(intern(compName))
+        x, y = compattr['pos']
+        positions.append(x)
+        positions.append(y)
+
+        sockets = {}
+        for sockName in compattr['leftsockets'] + compattr['rightsockets']:
+            sockets[sockName] = len(sockets)
+            socketNames.append(intern(sockName))
+        socketIndex.append(sockets)
+        leftCounts.append(len(compattr['leftsockets']))
+        socketStart.append(len(socketNames))
+
+    srcComps, srcSockets = array('I'), array('I')
+    dstComps, dstSockets = array('I'), array('I')
+    for srcname, dstname, connattr in schem.edges(data=True):
+        srcidx = compIndex[srcname]
+        dstidx = compIndex[dstname]
+        srcComps.append(srcidx)
+        srcSockets.append(socketIndex[srcidx][connattr['srcoutp']])
+        dstComps.append(dstidx)
+        dstSockets.append(socketIndex[dstidx][connattr['dstinp']])
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(strings), len(stringData),
+        len(compNames), len(socketNames), len(srcComps))
+
+    sections = [stringOffsets, stringData, compNames, positions, socketStart,
+        leftCounts, socketNames, srcComps, srcSockets, dstComps, dstSockets]
+
+    with open(filename, 'wb') as f:
+        offset = len(header)
+        f.write(header)
+        for section in sections:
+            padding = _align(offset) - offset
+            f.write(b'\0' * padding)
+            if isinstance(section, array):
+                section = _toLittleEndian(section)
+            data = memoryview(section).cast('B')
+            f.write(data)
+            offset += padding + len(data)
+
+
+def readBinary(schem, filename):
+    """
+    Loads a binary schematic file into a (fresh) schematic.
+
+    The file is memory mapped and the sections are used in place, only the
+    strings are decoded.
+
+    Parameters
+    ----------
+    schem : Schematic in which the components and links are added
+    filename : string with file path
+
+    Raises
+    ------
+    ValueError
+        When the file is not a binary schematic or is inconsistent.
+    """
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # All views on the file must be released before the mmap can be closed
+        views = [memoryview(mm)]
+        try:
+            _readSections(schem, views[0], views)
+        except Exception as e:
+            # The frames in the traceback refer to the sections as well
+            traceback.clear_frames(e.__traceback__)
+            raise
+        finally:
+            for view in reversed(views):
+                view.release()
+
+
+def _readSections(schem, view, views):
+    if len(view) < HEADER.size:
+        raise ValueError('File too small to be a binary schematic')
+    magic, version, flags, nstrings, stringBytes, ncomps, nsockets, nlinks = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError('Not a binary schematic file')
+    if version != VERSION:
+        raise ValueError('Unsupported binary schematic version ' + str(version))
+
+    offset = HEADER.size
+
+    def section(typecode, count):
+        nonlocal offset
+        start = _align(offset)
+        size = count * array(typecode).itemsize
+        if start + size > len(view):
+            raise ValueError('Binary schematic file is truncated')
+        offset = start + size
+        views.append(view[start:offset])
+        data = _fromLittleEndian(views[-1], typecode)
+        if isinstance(data, memoryview):
+            views.append(data)
+        return data
+
+    stringOffsets = section('I', nstrings + 1)
+    _checkIndices(stringOffsets, stringBytes + 1, 'string offset')
+    # The strings are decoded anyway, a copy of their data holds no view
+    stringData = section('B', stringBytes).tobytes()
+    try:
+        strings = [str(stringData[stringOffsets[i]:stringOffsets[i + 1]], 'utf-8') for i in range(nstrings)]
+    except UnicodeDecodeError:
+        raise ValueError('Binary schematic file has an invalid string') from None
+
+    compNames = section('I', ncomps)
+    positions = section('d', 2 * ncomps)
+    socketStart = section('I', ncomps + 1)
+    leftCounts = section('I', ncomps)
+    socketNames = section('I', nsockets)
+    srcComps = section('I', nlinks)
+    srcSockets = section('I', nlinks)
+    dstComps = section('I', nlinks)
+    dstSockets = section('I', nlinks)
+
+    _checkIndices(compNames, nstrings, 'component name')
+    _checkIndices(socketNames, nstrings, 'socket name')
+    _checkIndices(socketStart, nsockets + 1, 'socket start')
+    _checkIndices(srcComps, ncomps, 'link source')
+    _checkIndices(dstComps, ncomps, 'link destination')
+
+    names = [strings[i] for i in compNames]
+    sockets = [[strings[i] for i in socketNames[socketStart[c]:socketStart[c + 1]]] for c in range(ncomps)]
+
+    schem.add_components_bulk((names[c], sockets[c][:leftCounts[c]], sockets[c][leftCounts[c]:],
+        (positions[2 * c], positions[2 * c + 1])) for c in range(ncomps))
+
+    def links():
+        for src, srcsock, dst, dstsock in zip(srcComps, srcSockets, dstComps, dstSockets):
+            if srcsock >= len(sockets[src]) or dstsock >= len(sockets[dst]):
+                raise ValueError('Binary schematic file has a link to an invalid socket')
+            yield names[src], names[dst], sockets[src][srcsock], sockets[dst][dstsock]
+
+    schem.add_links_bulk(links())
+
+
+def jsonToBinary(jsonfile, binfile):
+    """
+    Converts a JSON schematic file into a binary schematic file.
+    """
+    from schematic import Schematic
+    schem = Schematic()
+    schem.loadFromFile(jsonfile)
+    writeBinary(schem, binfile)
+
+
+def binaryToJson(binfile, jsonfile):
+    """
+    Converts a binary schematic file into a JSON schematic file.
+    """
+    from schematic import Schematic
+    schem = Schematic()
+    readBinary(schem, binfile)
+    schem.storeToFile(jsonfile)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('usage: schematicbin.py <input> <output>')
+        print('  converts JSON to binary or binary to JSON, based on the input file')
+        sys.exit(1)
+
+    if isBinarySchematic(sys.argv[1]):
+        binaryToJson(sys.argv[1], sys.argv[2])
+    else:
+        jsonToBinary(sys.argv[1], sys.argv[2])
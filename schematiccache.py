@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Content addressed on-disk cache of loaded schematics
+
+Every cached schematic is stored as a pickled graph in a file named after the
+hash of the schematic file contents. A second, small file named after the
+hash of (path, mtime, size) refers to it, so an unchanged file does not have
+to be hashed again when it is reopened.
+
+Invalidation:
+- a file that is modified gets a new mtime/size, so its contents are hashed
+  again and only an entry with exactly the same contents is used
+- a file that is modified while it is being loaded is not stored
+- entries of an older cache format or networkx version are never used, since
+  the versions are part of every key
+- the least recently used files are removed when the cache grows beyond
+  its maximum size, clear() removes everything
+
+The cache directory is trusted: only use a directory that is writable by the
+user only, since the entries are unpickled.
+
+author: Rinse Wester
+
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+
+import networkx as nx
+
+CACHE_VERSION = 1
+
+# Cached graphs are only valid for the same cache format and networkx version
+VERSION_TAG = '{}-{}'.format(CACHE_VERSION, nx.__version__)
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'schemaviz')
+DEFAULT_MAX_BYTES = 1 << 30
+
+ENTRY_EXT = '.schematic'
+REF_EXT = '.ref'
+
+
+class CacheKey(object):
+    """
+    Identifies a schematic file: stat based key and content hash.
+    """
+
+    def __init__(self, filename, statKey, contentHash, stat):
+        self.filename = filename
+        self.statKey = statKey
+        self.contentHash = contentHash
+        self.stat = stat
+
+
+class SchematicCache(object):
+    """
+    On-disk cache of loaded schematics with a size bounded LRU policy.
+
+    Parameters
+    ----------
+    directory : directory in which the cache files are stored
+    maxBytes : maximum total size of the cache files
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def key(self, filename):
+        """
+        Returns the CacheKey of a schematic file.
+
+        The contents are only hashed when the path, mtime or size of the file
+        are not known to the cache yet.
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        statKey = self._hash('{}\0{}\0{}\0{}'.format(VERSION_TAG, path, stat.st_mtime_ns, stat.st_size).encode('utf-8'))
+
+        refPath = self._path(statKey, REF_EXT)
+        try:
+            with open(refPath, 'r') as f:
+                contentHash = f.read().strip()
+            self._touch(refPath)
+        except OSError:
+            contentHash = self._hashFile(path)
+
+        return CacheKey(path, statKey, contentHash, stat)
+
+    def load(self, key):
+        """
+        Returns the cached schematic for key or None when it is not cached.
+        """
+        entryPath = self._path(key.contentHash, ENTRY_EXT)
+        try:
+            f = open(entryPath, 'rb')
+        except OSError:
+            self.misses += 1
+            return None
+
+        with f:
+            # The graph consists of many small containers, collecting
+            # garbage while they are created only costs time
+            gcWasEnabled = gc.isenabled()
+            gc.disable()
+            try:
+                schem = pickle.load(f)
+                if not isinstance(schem, nx.Graph):
+                    raise pickle.UnpicklingError('Cache entry is not a graph')
+            except Exception:
+                # A damaged entry, or one that no longer matches the classes
+                # it was pickled from, is dropped and the file parsed again
+                schem = None
+            finally:
+                if gcWasEnabled:
+                    gc.enable()
+
+        if schem is None:
+            self._remove(entryPath)
+            self.misses += 1
+            return None
+
+        self._touch(entryPath)
+        self.hits += 1
+        return schem
+
+    def store(self, schem, key):
+        """
+        Stores a (validated) schematic in the cache.
+
+        Nothing is stored when the file changed since the key was made.
+        """
+        stat = os.stat(key.filename)
+        if (stat.st_mtime_ns, stat.st_size) != (key.stat.st_mtime_ns, key.stat.st_size):
+            return
+
+        self._writeAtomic(self._path(key.contentHash, ENTRY_EXT),
+            pickle.dumps(schem, protocol=pickle.HIGHEST_PROTOCOL))
+        self._writeAtomic(self._path(key.statKey, REF_EXT), key.contentHash.encode('ascii'))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache fits in maxBytes.
+        """
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith((ENTRY_EXT, REF_EXT)):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.maxBytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Removes all files from the cache.
+        """
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith((ENTRY_EXT, REF_EXT)):
+                os.remove(entry.path)
+
+    def _path(self, digest, ext):
+        return os.path.join(self.directory, digest + ext)
+
+    def _hash(self, data):
+        return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    def _hashFile(self, path):
+        h = hashlib.blake2b(digest_size=20)
+        h.update('{}\0'.format(VERSION_TAG).encode('ascii'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _touch(self, path):
+        # The mtime of the cache files is used as time of last use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _writeAtomic(self, path, data):
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmppath, path)
+        except BaseException:
+            os.remove(tmppath)
+            raise
@@ -9,17 +9,45 @@ author: Rinse Wester
 """
 
 import sys
+import math
 import random as rnd
 
-from PyQt5.QtWidgets import QWidget, QGraphicsView, QGraphicsScene, QHBoxLayout, QFrame
-from PyQt5.QtCore import Qt, QRectF, QPointF
-from PyQt5.QtGui import QTransform, QPainter, QColor, QPalette
+from PyQt5.QtWidgets import QWidget, QGraphicsView, QGraphicsScene, QHBoxLayout, QFrame, QStyleOptionGraphicsItem
+from PyQt5.QtCore import Qt, QRectF, QPointF, QTimer
+from PyQt5.QtGui import QTransform, QPainter, QColor, QPalette, QPainterPath
+
+import networkx as nx
 
 import schemastyle
+import instrumentation
 from schematic import Schematic
+from journal import SchematicJournal
 from componentgi import ComponentGI
-from socketgi import SocketGI
 from linkgi import LinkGI, PartialLinkGI
+from linkgeometry import updateLinkShapes
+from spatialindex import GridIndex, BoundsIndex
+from linklayer import LinkLayer
+from backgroundgrid import BackgroundGrid
+
+# Nr of items created per step when populating a scene
+POPULATE_CHUNK_SIZE = 500
+
+# Cell size of the grid index of socket connection points
+SOCKET_INDEX_CELL_SIZE = 50
+
+# Schematics with at least this many components are shown in a virtual scene,
+# which only has items for the components near the visible part of the scene
+VIRTUAL_MIN_COMPONENTS = 20000
+# Cell size of the grid index of component positions of a virtual scene
+COMPONENT_INDEX_CELL_SIZE = 500
+# Part of the size of the visible rect by which it is extended on all sides
+# when creating items, so scrolling a bit does not create new items
+VIRTUAL_MARGIN = 0.5
+# When more components are near the visible part, no items are created and
+# the virtual scene shows an overview of the schematic instead
+VIRTUAL_MAX_COMPONENTS = 5000
+# Max nr of unused component items kept for reuse
+VIRTUAL_POOL_SIZE = 2000
 
 class SchemaView(QGraphicsView):
 
@@ -68,19 +96,47 @@ class SchemaView(QGraphicsView):
         self.scene().addComponent(comp)
 
     def mouseMoveEvent(self, event):
+        if event.buttons() == Qt.NoButton and not self.scene().nowConnecting:
+            # Links are only items when they are hovered, see LinkLayer
+            pos = self.mapToScene(event.pos())
+            self.scene().hoverLinkAt(pos.x(), pos.y())
+
         if self.scene().nowConnecting:
             newPos = self.mapToScene(event.pos())
-            self.scene().plink.setDestTempPos(newPos.x(), newPos.y())
+            # Snap the end of the new link to a nearby free socket
+            sock = self.scene().freeSocketAt(newPos.x(), newPos.y(), schemastyle.SOCKET_SNAP_RADIUS)
+            if sock is not None:
+                self.scene().plink.setDestTempPos(*sock.linkConnectionPos())
+            else:
+                self.scene().plink.setDestTempPos(newPos.x(), newPos.y())
 
         super().mouseMoveEvent(event)
 
     def mousePressEvent(self, event):
-        # Abort connectio when in connecting mode and not clicking on a socket
-        if self.scene().nowConnecting and len(list(filter(lambda i: isinstance(i, SocketGI), self.items(event.pos())))) == 0:
-                self.scene().abortConnecting()
+        # When connecting, connect to the socket the link snapped to or abort
+        # connecting when not clicking near a free socket
+        if self.scene().nowConnecting:
+            pos = self.mapToScene(event.pos())
+            sock = self.scene().freeSocketAt(pos.x(), pos.y(), schemastyle.SOCKET_SNAP_RADIUS)
+            if sock is not None:
+                self.scene().finishConnecting(sock)
+                event.accept()
+                return
+            self.scene().abortConnecting()
 
         super().mousePressEvent(event)
 
+    def mouseReleaseEvent(self, event):
+        # Idle links are no items, so the rubber band only selected the
+        # promoted ones
+        band = self.rubberBandRect()
+        super().mouseReleaseEvent(event)
+        if not band.isNull():
+            area = QPainterPath()
+            area.addPolygon(self.mapToScene(band))
+            area.closeSubpath()
+            self.scene().selectLinksIn(area, self.rubberBandSelectionMode())
+
     def wheelEvent(self, event):
         #Catch wheelEvent and zoom instead of scroll when Ctrl is pressed
         if event.modifiers() & Qt.ControlModifier:
@@ -99,11 +155,9 @@ class SchemaView(QGraphicsView):
             self.setDragMode(True)           
 
         if event.key() == Qt.Key_Delete or event.key() == Qt.Key_Backspace:
-            for item in self.scene().selectedItems():
-                if isinstance(item, LinkGI):
-                    self.scene().removeLink(item)
-                elif isinstance(item, ComponentGI):
-                    self.scene().removeComponent(item)
+            self.scene().removeSelection()
+        elif event.key() == Qt.Key_A and event.modifiers() & Qt.ControlModifier:
+            self.scene().selectAll()
         elif event.key() == Qt.Key_Escape and self.scene().nowConnecting:
             self.scene().abortConnecting()
         else:
@@ -115,6 +169,19 @@ class SchemaView(QGraphicsView):
         self.setDragMode(QGraphicsView.RubberBandDrag)
         super().keyReleaseEvent(event)
 
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.updateVisibleRect()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.updateVisibleRect()
+
+    def updateVisibleRect(self):
+        # A virtual scene only has items near the visible part
+        if self.scene() is not None:
+            self.scene().setVisibleRect(self.mapToScene(self.viewport().rect()).boundingRect())
+
     def resetView(self):
         self.zoomLevel = self.defaultZoomLevel
         self.setupMatrix()
@@ -125,6 +192,7 @@ class SchemaView(QGraphicsView):
         transform = QTransform()
         transform.scale(scale, scale)
         self.setTransform(transform)
+        self.updateVisibleRect()
 
     def zoomIn(self):
         self.zoomLevel += 10
@@ -147,9 +215,71 @@ class SchemaScene(QGraphicsScene):
         self.components = {}
         self.links = {}
 
+        # The schematic shown in the scene, kept up to date with every edit.
+        # While a snapshot of it is written in the background the edits are
+        # kept as journal records and applied once the snapshot is written,
+        # see edit(). Until then the items are ahead of the schematic.
+        self.schematic = Schematic()
+        self.pendingEdits = None
+        self.pendingRemovedLinks = set()
+
+        # Connection points of all sockets for finding sockets near a position
+        self.socketIndex = GridIndex(SOCKET_INDEX_CELL_SIZE)
+
+        # Links of which the shape has to be updated because a component moved.
+        # They are reshaped at once when the event loop is idle again, so every
+        # link is reshaped once per frame however many of its components moved.
+        # The sockets of moved components are reindexed on the next query.
+        self.dirtyLinks = set()
+        self.unindexedComponents = set()
+        self.reshapeTimer = QTimer()
+        self.reshapeTimer.setSingleShot(True)
+        self.reshapeTimer.setInterval(0)
+        self.reshapeTimer.timeout.connect(self.reshapeLinks)
+
+        # Nr of links per cell of the density layer shown instead of the links
+        # in the overview, and the highest count. Computed when needed. A
+        # virtual scene has a density layer of its components as well.
+        self.linkDensity = None
+        self.maxLinkDensity = 0
+        self.componentDensity = None
+        self.maxComponentDensity = 0
+
+        self.drawGrid = True
+        self.grid = BackgroundGrid()
+
+        # Rectangles of all components in the schematic, for the bounds of
+        # the scene without walking all items
+        self.bounds = BoundsIndex()
+
+        # A virtual scene only has items for the components near the visible
+        # rect and the links between them. The schematic is the complete
+        # design, with an index of the component positions. Unused component
+        # items are kept in a pool per socket layout.
+        self.virtual = False
+        self.componentIndex = GridIndex(COMPONENT_INDEX_CELL_SIZE)
+        self.componentPool = {}
+        self.pooled = 0
+        self.materializedRect = QRectF()
+        self.showOverview = False
+        # Selected components without an item
+        self.selectedNames = set()
+
+        # Idle links are drawn in batches, links become items only when they
+        # are selected, hovered or dragged along with a component
+        self.linkLayer = LinkLayer(self)
+        self.selectionChanged.connect(self.linkLayer.demoteIdle)
+        self.selectionChanged.connect(self.selectionUpdated)
+        self.mouseDown = False
+
         self.plink = None
         self.nowConnecting = False
 
+        # Journal of the edits to the file shown in the scene, and the
+        # components that moved since their move was last journaled
+        self.journal = None
+        self.movedComponents = set()
+
     def genLinkName(self):
         # TODO find better way to generate unique name: keep short when possible
         name = 'e_' + str(rnd.randint(0, 100000000))
@@ -160,23 +290,84 @@ class SchemaScene(QGraphicsScene):
     def genCompName(self, prefix):
         # TODO find better way to generate unique name: keep short when possible
         name = prefix + '_' + str(rnd.randint(0, 1000))
-        while name in self.links.keys():
+        while name in self.schematic.node or name in self.components:
             name = prefix + '_' + str(rnd.randint(0, 1000))
         return name
 
+    def edit(self, op, **fields):
+        # Journal an edit and apply it to the schematic, returns the result of
+        # SchematicJournal.apply() or None while the edit waits for a snapshot
+        if self.journal is not None:
+            self.journal.record(op, **fields)
+        fields['op'] = op
+        if self.pendingEdits is not None:
+            self.pendingEdits.append(fields)
+            return None
+        return SchematicJournal.apply(self.schematic, fields)
+
+    def applyPendingEdits(self):
+        # The snapshot is done: bring the schematic up to date with the items
+        edits = self.pendingEdits
+        self.pendingEdits = None
+        self.pendingRemovedLinks.clear()
+        if edits:
+            for record in edits:
+                key = SchematicJournal.apply(self.schematic, record)
+                link = self.links.get(record['name']) if record['op'] == 'addLink' else None
+                if link is not None:
+                    link.edgeKey = key
+            self.linkDensity = None
+            # Recycle the items that were kept meanwhile
+            self.materializedRect = QRectF()
+
     def addComponent(self, comp):
+        self.addComponentItem(comp)
+        leftsockets = list(comp.leftSocketGItems.keys())
+        rightsockets = list(comp.rightSocketGItems.keys())
+        self.edit('addComponent', name=comp.name, leftsockets=leftsockets,
+            rightsockets=rightsockets, pos=list(comp.location))
+        if self.virtual:
+            self.componentIndex.insert(comp.name, *comp.location)
+        self.indexBounds(comp.name)
+        self.updateSceneRect()
+        self.linkDensity = None
+
+    def addComponentItem(self, comp):
+        # Only add the item, the component is in the schematic already
         self.addItem(comp)
         self.components[comp.name] = comp
+        self.indexSockets(comp)
 
     def addLink(self, link):
-        self.addItem(link)
+        self.addLinkItem(link)
+        link.edgeKey = self.edit('addLink', src=link.srcSocket.parentComp.name, srcoutp=link.srcSocket.name,
+            dst=link.dstSocket.parentComp.name, dstinp=link.dstSocket.name, name=link.name)
+
+    def addLinkItem(self, link):
+        # Only add the item, the link is in the schematic already
+        self.linkLayer.add(link)
         self.links[link.name] = link
+        self.linkDensity = None
+
+    def addLinkItems(self, links, rects=None):
+        # Same as addLinkItem() for every link in links, rects as returned by
+        # updateLinkShapes()
+        self.linkLayer.addLinks(links, rects)
+        for link in links:
+            self.links[link.name] = link
+        self.linkDensity = None
 
     def removeLink(self, link):
+        self.edit('removeLink', src=link.srcSocket.parentComp.name, srcoutp=link.srcSocket.name,
+            dst=link.dstSocket.parentComp.name, dstinp=link.dstSocket.name)
+        if self.pendingEdits is not None:
+            self.pendingRemovedLinks.add(link.name)
+        self.dirtyLinks.discard(link)
+        self.linkDensity = None
         link.srcSocket.link = None
         link.dstSocket.link = None
         del(self.links[link.name])
-        self.removeItem(link)
+        self.linkLayer.remove(link)
 
     def removeComponent(self, comp):
         # First remove all links:
@@ -187,9 +378,181 @@ class SchemaScene(QGraphicsScene):
             if s.link is not None:
                 self.removeLink(s.link)
         # and now remove the component as well
+        self.removeComponentItem(comp)
+        self.movedComponents.discard(comp)
+        self.removeComponentByName(comp.name)
+
+    def removeComponentItem(self, comp):
+        # Only remove the item, not the component in the schematic
+        for s in comp.leftSocketGItems.values():
+            self.socketIndex.remove(s)
+        for s in comp.rightSocketGItems.values():
+            self.socketIndex.remove(s)
+        self.unindexedComponents.discard(comp)
         del(self.components[comp.name])
         self.removeItem(comp)
 
+    def removeComponentByName(self, name):
+        # Remove a component from the schematic together with its links to
+        # components without an item in a virtual scene
+        self.edit('removeComponent', name=name)
+        self.componentIndex.remove(name)
+        self.bounds.remove(name)
+        self.updateSceneRect()
+        self.linkDensity = None
+
+    def removeSelection(self):
+        selected = self.selectedItems()
+        for item in selected:
+            if isinstance(item, LinkGI) and self.links.get(item.name) is item:
+                self.removeLink(item)
+        for item in selected:
+            if isinstance(item, ComponentGI):
+                self.removeComponent(item)
+        for name in list(self.selectedNames):
+            self.removeComponentByName(name)
+        self.selectedNames.clear()
+
+    def selectAll(self):
+        for item in self.components.values():
+            item.setSelected(True)
+        if self.virtual:
+            self.selectedNames = set(self.componentIndex).difference(self.components)
+
+    def clearSelection(self):
+        self.selectedNames.clear()
+        super().clearSelection()
+
+    def selectLinksIn(self, area, mode=Qt.IntersectsItemShape):
+        # Adds the idle links in area to the selection, they become items
+        links = self.linkLayer.idleLinksIn(area, mode)
+        if links:
+            # One selectionChanged for all links, as for a rubber band
+            self.blockSignals(True)
+            try:
+                for link in links:
+                    self.linkLayer.promote(link)
+                    link.setSelected(True)
+            finally:
+                self.blockSignals(False)
+            self.selectionChanged.emit()
+
+    def selectedComponentNames(self):
+        # Names of all selected components, also those without an item
+        names = set(self.selectedNames)
+        for item in self.selectedItems():
+            if isinstance(item, ComponentGI):
+                names.add(item.name)
+        return names
+
+    def selectionUpdated(self):
+        # Clearing the selection of the items clears it completely
+        if self.selectedNames and not self.selectedItems():
+            self.selectedNames.clear()
+
+    def componentMoved(self, comp):
+        # Called by components when their position changed
+        self.movedComponents.add(comp)
+        self.unindexedComponents.add(comp)
+
+    def linkMoved(self, link):
+        # Called by components when an end of link moved
+        self.dirtyLinks.add(link)
+        if self.mouseDown and isinstance(link, LinkGI):
+            # Dragged along with a component
+            self.linkLayer.promote(link)
+        if not self.reshapeTimer.isActive():
+            self.reshapeTimer.start()
+
+    def reshapeLinks(self):
+        instrumentation.record('link reshapes per frame', len(self.dirtyLinks))
+        # The link being connected has no destination socket yet
+        links = [link for link in self.dirtyLinks if isinstance(link, LinkGI)]
+        rects = updateLinkShapes(links)
+        self.linkLayer.reshapedLinks(links, rects)
+        for link in self.dirtyLinks:
+            if not isinstance(link, LinkGI):
+                link.updateShape()
+        self.dirtyLinks.clear()
+
+    def linkAt(self, x, y, radius=schemastyle.LINK_HIT_RADIUS):
+        return self.linkLayer.linkAt(x, y, radius)
+
+    def hoverLinkAt(self, x, y):
+        self.linkLayer.hover(self.linkAt(x, y))
+
+    def indexMovedSockets(self):
+        for comp in self.unindexedComponents:
+            self.indexSockets(comp)
+        self.unindexedComponents.clear()
+
+    def indexSockets(self, comp):
+        # Put the connection points of the sockets of comp in the index
+        for s in comp.leftSocketGItems.values():
+            self.socketIndex.insert(s, *s.linkConnectionPos())
+        for s in comp.rightSocketGItems.values():
+            self.socketIndex.insert(s, *s.linkConnectionPos())
+
+    def socketAt(self, x, y, radius=schemastyle.SOCKET_HIT_RADIUS):
+        # The socket with its connection point nearest to (x, y) within radius
+        self.indexMovedSockets()
+        return self.socketIndex.nearest(x, y, radius)
+
+    def freeSocketAt(self, x, y, radius=schemastyle.SOCKET_HIT_RADIUS):
+        # Like socketAt() but only for sockets without a link
+        self.indexMovedSockets()
+        return self.socketIndex.nearest(x, y, radius, lambda s: s.link is None)
+
+    def flushMoves(self):
+        # Store the final positions of the components that moved in the
+        # schematic and the journal
+        if self.movedComponents:
+            for comp in self.movedComponents:
+                self.edit('moveComponent', name=comp.name, pos=list(comp.location))
+                if self.virtual:
+                    self.componentIndex.insert(comp.name, *comp.location)
+                self.indexBounds(comp.name)
+            self.movedComponents.clear()
+            self.updateSceneRect()
+            self.linkDensity = None
+
+    # Graph queries on the schematic shown in the scene
+    def successors(self, compname):
+        return list(self.schematic.successors(compname))
+
+    def predecessors(self, compname):
+        return list(self.schematic.predecessors(compname))
+
+    def downstream(self, compname):
+        # All components that can be reached from compname
+        return nx.descendants(self.schematic, compname)
+
+    def upstream(self, compname):
+        # All components from which compname can be reached
+        return nx.ancestors(self.schematic, compname)
+
+    def mousePressEvent(self, event):
+        self.mouseDown = True
+        nrSelected = len(self.selectedItems())
+        super().mousePressEvent(event)
+        # Without selected items Qt does not signal that a click replaced the
+        # selection, so clear the selected components without an item here
+        if self.selectedNames and not nrSelected and not event.modifiers() & Qt.ControlModifier:
+            if self.selectedItems() or self.itemAt(event.scenePos(), QTransform()) is None:
+                self.selectedNames.clear()
+
+    def mouseReleaseEvent(self, event):
+        nrSelected = len(self.selectedItems())
+        super().mouseReleaseEvent(event)
+        # A click on a selected item selects only that item
+        if self.selectedNames and 0 < len(self.selectedItems()) < nrSelected and \
+                not event.modifiers() & Qt.ControlModifier:
+            self.selectedNames.clear()
+        # A drag of components is finished
+        self.mouseDown = False
+        self.flushMoves()
+        self.linkLayer.demoteIdle()
+
     def startConnecting(self, srcSocket):
         self.plink = PartialLinkGI()
         self.plink.setSourceSocket(srcSocket)
@@ -199,6 +562,7 @@ class SchemaScene(QGraphicsScene):
     def abortConnecting(self):
         # First remove link from component
         self.plink.srcSocket.link = None
+        self.dirtyLinks.discard(self.plink)
         # then remove link an go back in unconnecting state
         self.removeItem(self.plink)
         del(self.plink)
@@ -213,73 +577,398 @@ class SchemaScene(QGraphicsScene):
 
     def drawBackground(self, painter, rect):
         painter.fillRect(rect, schemastyle.BACKGROUND_COLOR)
-
-    # TODO add function like setSchema to keep schema object alive or 
-    #   easy graph operations like find successors and DFS algorithms
-    def loadFromFile(self, filename):
-        schem = Schematic()
-        schem.loadFromFile(filename)
+        if self.drawGrid:
+            self.grid.draw(painter, rect)
+
+        # In the overview the links are not drawn, show where they are instead.
+        # A virtual scene without items shows where the components are too.
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        if schemastyle.lodTier(lod) == schemastyle.LOD_TIER_OVERVIEW or self.showOverview:
+            if self.linkDensity is None:
+                self.computeDensity()
+            self.drawDensity(painter, rect, self.linkDensity, self.maxLinkDensity, schemastyle.LINK_DENSITY_COLOR)
+            if self.showOverview:
+                self.drawDensity(painter, rect, self.componentDensity, self.maxComponentDensity,
+                    schemastyle.COMPONENT_OVERVIEW_COLOR)
+
+    def drawDensity(self, painter, rect, density, maxDensity, color):
+        cellSize = schemastyle.LINK_DENSITY_CELL_SIZE
+        left = math.floor(rect.left() / cellSize)
+        right = math.floor(rect.right() / cellSize)
+        top = math.floor(rect.top() / cellSize)
+        bottom = math.floor(rect.bottom() / cellSize)
+        color = QColor(color)
+        if (right - left + 1) * (bottom - top + 1) < len(density):
+            # Look up the cells of the exposed rect
+            cells = ((cell, density.get(cell)) for cell in
+                ((cx, cy) for cy in range(top, bottom + 1) for cx in range(left, right + 1)))
+        else:
+            cells = density.items()
+        for (cx, cy), count in cells:
+            if count and left <= cx <= right and top <= cy <= bottom:
+                color.setAlpha(20 + 120 * count // maxDensity)
+                painter.fillRect(QRectF(cx * cellSize, cy * cellSize, cellSize, cellSize), color)
+
+    def computeDensity(self):
+        # Count for every cell the links of which the straight line between the
+        # positions of their components passes through the cell, and the
+        # components in the cell
+        cellSize = schemastyle.LINK_DENSITY_CELL_SIZE
+        nodes = self.schematic.node
+        density = {}
+        for src, dst in self.schematic.edges():
+            x0, y0 = nodes[src]['pos']
+            x1, y1 = nodes[dst]['pos']
+            steps = int(max(abs(x1 - x0), abs(y1 - y0)) // cellSize) + 1
+            cells = set()
+            for i in range(steps + 1):
+                t = i / steps
+                cells.add((math.floor((x0 + (x1 - x0) * t) / cellSize), math.floor((y0 + (y1 - y0) * t) / cellSize)))
+            for cell in cells:
+                density[cell] = density.get(cell, 0) + 1
+        self.linkDensity = density
+        self.maxLinkDensity = max(density.values(), default=1)
+
+        density = {}
+        for _, (x, y) in self.schematic.nodes(data='pos'):
+            cell = (math.floor(x / cellSize), math.floor(y / cellSize))
+            density[cell] = density.get(cell, 0) + 1
+        self.componentDensity = density
+        self.maxComponentDensity = max(density.values(), default=1)
+
+    def setVisibleRect(self, rect):
+        # Called by the view of a virtual scene when the visible part changes.
+        # Creates the items of the components near rect and the components
+        # linked to them and recycles the other items.
+        if not self.virtual or self.materializedRect.contains(rect):
+            return
+        margin = max(rect.width(), rect.height()) * VIRTUAL_MARGIN
+        near = rect.adjusted(-margin, -margin, margin, margin)
+        names = self.componentIndex.inRect(near.left(), near.top(), near.right(), near.bottom())
+        self.showOverview = len(names) > VIRTUAL_MAX_COMPONENTS
+        if self.showOverview:
+            names = []
+            # Update again as soon as the view shows less
+            self.materializedRect = QRectF()
+        else:
+            self.materializedRect = near
+
+        wanted = set(names)
+        nodes = self.schematic.node
+        for name in names:
+            if name in nodes:
+                wanted.update(self.schematic.successors(name))
+                wanted.update(self.schematic.predecessors(name))
+
+        if self.pendingEdits is not None:
+            # The schematic is behind the items until the snapshot is written:
+            # keep all items and only create the components that existed
+            # before the snapshot and were not removed meanwhile
+            wanted = {name for name in wanted if name in nodes and name in self.componentIndex}
+        else:
+            for name, comp in list(self.components.items()):
+                if name not in wanted and not self.inUse(comp):
+                    self.dematerialize(comp)
+        created = [name for name in wanted if name not in self.components]
+        for name in created:
+            self.materialize(name)
+        for name in created:
+            self.materializeLinks(name)
+        self.update()
+
+    def inUse(self, comp):
+        # Items that are interacted with are kept, a selected component is
+        # kept in selectedNames instead
+        return comp in self.movedComponents or \
+            (self.nowConnecting and self.plink.srcSocket.parentComp is comp)
+
+    def materialize(self, name):
+        attr = self.schematic.node[name]
+        layout = (tuple(attr['leftsockets']), tuple(attr['rightsockets']))
+        pool = self.componentPool.get(layout)
+        if pool:
+            comp = pool.pop()
+            comp.name = name
+            self.pooled -= 1
+        else:
+            comp = ComponentGI(name, leftSockets=attr['leftsockets'], rightSockets=attr['rightsockets'])
+        comp.location = attr['pos']
+        self.addComponentItem(comp)
+        if name in self.selectedNames:
+            self.selectedNames.discard(name)
+            comp.setSelected(True)
+
+    def materializeLinks(self, name):
+        # Create the links between name and the other components with items,
+        # except the links removed while edits wait for a snapshot
+        skip = self.pendingRemovedLinks
+        for src, dst, key, linkattr in self.schematic.out_edges(name, keys=True, data=True):
+            if dst in self.components and linkattr['name'] not in self.links and linkattr['name'] not in skip:
+                self.addLinkItem(self.createLinkItem(src, dst, key, linkattr))
+        for src, dst, key, linkattr in self.schematic.in_edges(name, keys=True, data=True):
+            if src in self.components and linkattr['name'] not in self.links and linkattr['name'] not in skip:
+                self.addLinkItem(self.createLinkItem(src, dst, key, linkattr))
+
+    def dematerialize(self, comp):
+        for s in list(comp.leftSocketGItems.values()) + list(comp.rightSocketGItems.values()):
+            if s.link is not None:
+                link = s.link
+                link.srcSocket.link = None
+                link.dstSocket.link = None
+                self.dirtyLinks.discard(link)
+                del(self.links[link.name])
+                self.linkLayer.remove(link)
+        if comp.isSelected():
+            # Still selected without an item, the selection of the other items
+            # does not change
+            self.selectedNames.add(comp.name)
+            self.blockSignals(True)
+            comp.setSelected(False)
+            self.removeComponentItem(comp)
+            self.blockSignals(False)
+        else:
+            self.removeComponentItem(comp)
+        if self.pooled < VIRTUAL_POOL_SIZE:
+            comp.hoverState.reset((False, None))
+            layout = (tuple(comp.leftSocketGItems.keys()), tuple(comp.rightSocketGItems.keys()))
+            self.componentPool.setdefault(layout, []).append(comp)
+            self.pooled += 1
+
+    def createLinkItem(self, src, dst, key, linkattr, deferShape=False):
+        srccomp = self.components[src]
+        dstcomp = self.components[dst]
+        name = linkattr['name']
+        srcsockname = linkattr['srcoutp']
+        dstsockname = linkattr['dstinp']
+        if srcsockname in srccomp.leftSocketGItems.keys():
+            srcsock = srccomp.leftSocketGItems[srcsockname]
+        else:
+            srcsock = srccomp.rightSocketGItems[srcsockname]
+        if dstsockname in dstcomp.leftSocketGItems.keys():
+            dstsock = dstcomp.leftSocketGItems[dstsockname]
+        else:
+            dstsock = dstcomp.rightSocketGItems[dstsockname]
+        link = LinkGI(name, srcsock, dstsock, deferShape=deferShape)
+        link.thickness = 2
+        link.edgeKey = key
+        return link
+
+    def loadFromFile(self, filename, cache=None, recover=False):
+        schem, journal = SchemaScene.loadSchematic(filename, cache, recover)
+        for _ in self.populate(schem, journal):
+            pass
+
+    @staticmethod
+    def loadSchematic(filename, cache=None, recover=False, progress=None):
+        # Load the schematic and bring it up to date with its journal. No items
+        # are created, so this can run in a worker thread.
+        timer = instrumentation.Timer('load parse s').start()
+        schem = Schematic.from_file(filename, progress=progress, cache=cache)
+        timer.stop()
+
+        # Apply the edits in the journal of the file, including the unsaved
+        # edits when recovering from a crash
+        journal = SchematicJournal(filename)
+        SchematicJournal.replay(schem, journal.open(recover))
+        if not journal.writable():
+            # Next to a read-only file the scene works without a journal
+            journal = None
+        return schem, journal
+
+    def populate(self, schem, journal, chunkSize=POPULATE_CHUNK_SIZE):
+        # Generator that fills the scene with items for a loaded schematic. It
+        # yields (done, total) after every chunkSize items, so the caller can
+        # spread the work over several iterations of the event loop. The time
+        # of every phase is recorded in the instrumentation stats.
+        self.virtual = schem.number_of_nodes() >= VIRTUAL_MIN_COMPONENTS
+        if self.virtual:
+            total = schem.number_of_nodes()
+        else:
+            total = schem.number_of_nodes() + schem.number_of_edges()
+        done = 0
 
         # start with a blank slate
+        self.closeJournal()
         self.links.clear()
         self.components.clear()
+        self.linkLayer.clear()
         self.clear()
+        self.socketIndex.clear()
+        self.dirtyLinks.clear()
+        self.unindexedComponents.clear()
+        self.movedComponents.clear()
+        self.linkDensity = None
+        self.componentIndex.clear()
+        self.bounds.clear()
+        self.componentPool.clear()
+        self.pooled = 0
+        self.materializedRect = QRectF()
+        self.showOverview = False
+        self.selectedNames.clear()
+        self.schematic = schem
+        self.pendingEdits = None
+
+        # Nobody looks at the scene while it is filled: the index of the items
+        # is built once at the end and no signals are sent
+        self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.blockSignals(True)
+
+        timer = instrumentation.Timer('load components s').start()
+        if self.virtual:
+            # Only index the positions, the items are created for the visible
+            # part by setVisibleRect()
+            for cmpname, (x, y) in schem.nodes(data='pos'):
+                self.componentIndex.insert(cmpname, x, y)
+                self.indexBounds(cmpname)
+                done += 1
+                if done % chunkSize == 0:
+                    timer.pause()
+                    yield done, total
+                    timer.start()
+        else:
+            # Create components based on graph and add them to the scene
+            for cmpname in schem.nodes():
+                comp = ComponentGI(cmpname, leftSockets=schem.node[cmpname]['leftsockets'],
+                    rightSockets=schem.node[cmpname]['rightsockets'])
+                comp.location = schem.node[cmpname]['pos']
+                self.addComponentItem(comp)
+                self.indexBounds(cmpname)
+                done += 1
+                if done % chunkSize == 0:
+                    timer.pause()
+                    yield done, total
+                    timer.start()
+        timer.stop()
+
+        # Add the links as well, their shapes are made when all components
+        # are at their place
+        timer = instrumentation.Timer('load links s').start()
+        if not self.virtual:
+            links = []
+            for src, dst, key, linkattr in schem.edges(keys=True, data=True):
+                links.append(self.createLinkItem(src, dst, key, linkattr, deferShape=True))
+                done += 1
+                if done % chunkSize == 0:
+                    timer.pause()
+                    yield done, total
+                    timer.start()
+            self.addLinkItems(links, updateLinkShapes(links))
+        timer.stop()
 
-        # Create components based on graph and add them to the scene
-        for cmpname in schem.nodes():
-            comp = ComponentGI(cmpname, leftSockets=schem.node[cmpname]['leftsockets'],
-                rightSockets=schem.node[cmpname]['rightsockets'])
-            comp.location = schem.node[cmpname]['pos']
-            # TODO: add better description in tooltip after <br/>
-            comp.setToolTip("<b>{}</b><br/>pos: {}".format(cmpname, comp.location))
-            self.addComponent(comp)
-
-        # Add the links as well
-        for src, dst, linkattr in schem.edges(data=True):
-            srccomp = self.components[src]
-            dstcomp = self.components[dst]
-            name = linkattr['name']
-            srcsockname = linkattr['srcoutp']
-            dstsockname = linkattr['dstinp']
-            if srcsockname in srccomp.leftSocketGItems.keys():
-                srcsock = srccomp.leftSocketGItems[srcsockname]
-            else:
-                srcsock = srccomp.rightSocketGItems[srcsockname]
-            if dstsockname in dstcomp.leftSocketGItems.keys():
-                dstsock = dstcomp.leftSocketGItems[dstsockname]
-            else:
-                dstsock = dstcomp.rightSocketGItems[dstsockname]
-            link = LinkGI(name, srcsock, dstsock)
-            link.thickness = 2
-            self.addLink(link)
-        
         # Update the scene bounding rectangle for a full view of the schematic
+        timer = instrumentation.Timer('load index s').start()
         self.updateSceneRect()
-
-    def saveToFile(self, filename):
-        schem = Schematic()
-
-        for compgi in self.components.values():
-            leftSocketNames = []
-            for lsi in compgi.leftSocketGItems.values():
-                leftSocketNames.append(lsi.name)
-            rightSocketNames = []
-            for rsi in compgi.rightSocketGItems.values():
-                rightSocketNames.append(rsi.name)
-            schem.add_component(compgi.name, leftsockets=leftSocketNames, rightsockets=rightSocketNames, pos=compgi.location)
-
-        for linkgi in self.links.values():
-            srcSocketname = linkgi.srcSocket.name
-            dstSocketname = linkgi.dstSocket.name
-            srcCompname = linkgi.srcSocket.parentComp.name
-            dstCompname = linkgi.dstSocket.parentComp.name
-            schem.add_link(srcCompname, dstCompname, srcSocketname, dstSocketname, name=linkgi.name)
-
-        schem.storeToFile(filename)
+        self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        # The index is built by the first query
+        self.items(QRectF(0, 0, 1, 1))
+        self.blockSignals(False)
+        timer.stop()
+
+        # From now on all edits are journaled
+        self.journal = journal
+        yield total, total
+
+    def saveToFile(self, filename, compressLevel=None):
+        if not self.saveJournal(filename):
+            self.writeSnapshot(filename, compressLevel)
+
+    def saveJournal(self, filename):
+        # Save by only committing the journal, returns False when a complete
+        # snapshot has to be written instead
+        if self.journal is not None:
+            self.flushMoves()
+            if self.journal.filename == filename and not self.journal.needsCompaction():
+                # Only the edits since the last save have to be written
+                self.journal.commit()
+                return True
+        return False
+
+    def writeSnapshot(self, filename, compressLevel=None):
+        # Write the complete schematic and start a new journal for it
+        schem = self.prepareSnapshot()
+        try:
+            schem.storeToFile(filename, compressLevel=compressLevel)
+        except BaseException:
+            self.abortSnapshot()
+            raise
+        self.finishSnapshot(filename)
+
+    def prepareSnapshot(self):
+        # Returns the current schematic for writing a snapshot while editing
+        # continues. Edits made in the meantime are applied to the schematic
+        # afterwards and carried over to the journal of the new snapshot.
+        self.flushMoves()
+        if self.journal is not None:
+            self.journal.beginSnapshot()
+        self.pendingEdits = []
+        return self.schematic
+
+    def abortSnapshot(self):
+        self.applyPendingEdits()
+        if self.journal is not None:
+            self.journal.abortSnapshot()
+
+    def finishSnapshot(self, filename):
+        # The snapshot is written to filename: start a new journal for it
+        self.applyPendingEdits()
+        carried = []
+        if self.journal is not None:
+            carried = self.journal.takeCarried()
+            if self.journal.filename != filename:
+                # The unsaved edits are part of the new file now
+                self.journal.discardUnsaved()
+                self.closeJournal()
+        if self.journal is None:
+            self.journal = SchematicJournal(filename)
+        self.journal.startSnapshot(carried)
+
+    def compactJournal(self):
+        # Fold the saved edits of the journal into the file when there are no
+        # unsaved edits, so the file is complete on its own
+        if self.journal is not None:
+            self.flushMoves()
+            if self.journal.unsavedOps == 0 and self.journal.savedOps > 0:
+                self.writeSnapshot(self.journal.filename)
+
+    def closeJournal(self):
+        if self.journal is not None:
+            self.flushMoves()
+            self.journal.close()
+            self.journal = None
 
     def updateSceneRect(self):
         # Is called when there is a change in the scene
         # Update scene size to fit the current layout of the graph
-        rect = self.itemsBoundingRect()
+        rect = self.designBoundingRect()
         rect = QRectF(rect.x() - 50, rect.y() - 50, rect.width() + 100, rect.height() + 100)
         self.setSceneRect(rect)
+
+    def itemsBoundingRect(self):
+        # A virtual scene covers all components, also those without an item
+        rect = super().itemsBoundingRect()
+        if self.virtual:
+            rect = rect.united(self.designBoundingRect())
+        return rect
+
+    def designBoundingRect(self):
+        # Bounding rect of all components in the schematic
+        bounds = self.bounds.bounds()
+        if bounds is None:
+            return QRectF()
+        left, top, right, bottom = bounds
+        return QRectF(left, top, right - left, bottom - top)
+
+    def indexBounds(self, name):
+        # Update the rect of a component in the bounds, computed the same way
+        # as the size of a ComponentGI. The item is ahead of the schematic
+        # while edits wait for a snapshot.
+        comp = self.components.get(name)
+        if comp is not None:
+            x, y = comp.location
+            nrSockets = max(len(comp.leftSocketGItems), len(comp.rightSocketGItems))
+        else:
+            attr = self.schematic.node[name]
+            x, y = attr['pos']
+            nrSockets = max(len(attr['leftsockets']), len(attr['rightsockets']))
+        height = nrSockets * 20 + 20
+        self.bounds.insert(name, x - 75, y - height // 2, x + 75, y + height // 2)
@@ -4,6 +4,10 @@
 """
 GraphicsItem to model a socket
 
+Besides SocketGI, which is an item of its own, a socket can be a Socket: a
+plain object that is painted and hit-tested by its ComponentGI. Designs with
+many components then do not need an item in the scene for every socket.
+
 author: Rinse Wester
 
 """
@@ -14,11 +18,137 @@ from PyQt5.QtCore import QRectF, QRect, QPointF, QPoint, Qt, QVariant
 from PyQt5.QtGui import QColor, QPainter, QBrush, QPainterPath, QLinearGradient, QFont, QContextMenuEvent
 from collections import Counter
 import schemastyle
+from rendercache import renderCache
+from hovertracker import HoverTracker
+
+# Size of a socket, sockets on one side of a component are SOCKET_HEIGHT apart
+SOCKET_WIDTH = 50
+SOCKET_HEIGHT = 20
+
+LEFT = 0
+RIGHT = 1
+
+
+def socketRect(location):
+    # Bounding rect of a socket in socket coordinates
+    if location == LEFT:
+        return QRectF(0, -SOCKET_HEIGHT // 2, SOCKET_WIDTH, SOCKET_HEIGHT)
+    else:
+        return QRectF(-SOCKET_WIDTH, -SOCKET_HEIGHT // 2, SOCKET_WIDTH, SOCKET_HEIGHT)
+
+
+def onConnectionPoint(location, x):
+    # True when x in socket coordinates is over the connection point
+    if location == LEFT:
+        return x < SOCKET_HEIGHT
+    else:
+        return x > -SOCKET_HEIGHT
+
+
+def paintSocket(painter, lod, location, name, hovering):
+    # All sockets with the same name and side share a pixmap
+    tier = schemastyle.lodTier(lod)
+    if tier == schemastyle.LOD_TIER_FULL:
+        key = ('socket', location, name, hovering)
+        renderCache.paint(painter, key, socketRect(location), lod,
+            lambda p: paintDetailed(p, location, name, hovering))
+    elif tier == schemastyle.LOD_TIER_MEDIUM:
+        key = ('socketdot', location, hovering)
+        renderCache.paint(painter, key, socketRect(location), lod,
+            lambda p: paintDot(p, location, hovering))
+    # sockets are not drawn at lower levels of detail
+
+
+def paintDot(painter, location, hovering):
+    # Only the connection point, without the name
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QBrush(schemastyle.SOCKET_CONNECTED_COLOR if hovering else schemastyle.SOCKET_NEUTRAL_COLOR))
+    if location == LEFT:
+        painter.drawEllipse(QPoint(SOCKET_HEIGHT // 2, 0), 6, 6)
+    else:
+        painter.drawEllipse(QPoint(-SOCKET_HEIGHT // 2, 0), 6, 6)
+
+
+def paintDetailed(painter, location, name, hovering):
+    # Draw in high detail
+    painter.setPen(Qt.NoPen)
+    if hovering:
+        painter.setBrush(QBrush(schemastyle.SOCKET_CONNECTED_COLOR))
+        rad = 7
+    else:
+        painter.setBrush(QBrush(schemastyle.SOCKET_NEUTRAL_COLOR))
+        rad = 6
+    oldfont = painter.font()
+    font = QFont(oldfont)
+    font.setPixelSize(10)
+    painter.setFont(font)
+    if location == LEFT:
+        painter.drawEllipse(QPoint(SOCKET_HEIGHT // 2, 0), rad, rad)
+        textrect = QRectF(SOCKET_HEIGHT, -SOCKET_HEIGHT // 2, SOCKET_WIDTH - SOCKET_HEIGHT, SOCKET_HEIGHT)
+        painter.setPen(schemastyle.SOCKET_NAME_COLOR)
+        painter.drawText(textrect, Qt.AlignLeft | Qt.AlignVCenter, name)
+    else:
+        painter.drawEllipse(QPoint(-SOCKET_HEIGHT // 2, 0), rad, rad)
+        textrect = QRectF(-SOCKET_WIDTH, -SOCKET_HEIGHT // 2, SOCKET_WIDTH - SOCKET_HEIGHT, SOCKET_HEIGHT)
+        painter.setPen(schemastyle.SOCKET_NAME_COLOR)
+        painter.drawText(textrect, Qt.AlignRight | Qt.AlignVCenter, name)
+
+    # restore font
+    painter.setFont(oldfont)
+
+
+class Socket(object):
+    """
+    Socket without an item of its own, its ComponentGI paints it and handles
+    the mouse for it.
+
+    Parameters
+    ----------
+    name : name of the socket
+    location : LEFT or RIGHT side of the component
+    parent : the ComponentGI of the socket
+    x, y : position of the socket in component coordinates
+    """
+
+    __slots__ = ('sockName', 'sockLocation', 'parentComp', 'link', 'x', 'y')
+
+    def __init__(self, name, location, parent, x, y):
+        self.sockName = name
+        self.sockLocation = location
+        self.parentComp = parent
+        self.link = None
+        self.x = x
+        self.y = y
+
+    @property
+    def name(self):
+        return self.sockName
+
+    @name.setter
+    def name(self, name):
+        self.sockName = name
+        self.update()
+
+    @property
+    def hovering(self):
+        return self.parentComp.hoverSocket is self
+
+    def update(self):
+        self.parentComp.update(socketRect(self.sockLocation).translated(self.x, self.y))
+
+    def linkConnectionPos(self):
+        # Components are never rotated or scaled, so this is mapToScene()
+        if self.sockLocation == LEFT:
+            dx = SOCKET_HEIGHT / 2.0
+        else:
+            dx = -SOCKET_HEIGHT / 2.0
+        return self.parentComp.x() + self.x + dx, self.parentComp.y() + self.y
+
 
 class SocketGI(QGraphicsItem):
 
-    LEFT = 0
-    RIGHT = 1
+    LEFT = LEFT
+    RIGHT = RIGHT
 
     def __init__(self, name, location, parent):
         super().__init__()
@@ -26,64 +156,37 @@ class SocketGI(QGraphicsItem):
         self.setAcceptHoverEvents(True)
         self.setFlag(QGraphicsItem.ItemIsSelectable, True)
         
-        self.sockWidth = 50
-        self.sockHeight = 20
+        self.sockWidth = SOCKET_WIDTH
+        self.sockHeight = SOCKET_HEIGHT
 
         self.sockName = name
         self.sockLocation = location
         self.parentComp = parent
         self.link = None
-        self.hovering = False
+        # Hovering over the connection point or not
+        self.hoverState = HoverTracker(self, False)
 
-        if self.sockLocation == SocketGI.LEFT:
-            self.sockBRect = QRectF(0, -self.sockHeight // 2, self.sockWidth, self.sockHeight)
-        else:
-            self.sockBRect = QRectF(-self.sockWidth, -self.sockHeight // 2, self.sockWidth, self.sockHeight)
+        self.sockBRect = socketRect(self.sockLocation)
+
+    @property
+    def hovering(self):
+        return self.hoverState.target
 
     def boundingRect(self):
         return self.sockBRect
     
     def paint(self, painter, option, widget):
-        # Draw in high detail
-        painter.setPen(Qt.NoPen)
-        if self.hovering:
-            painter.setBrush(QBrush(schemastyle.SOCKET_CONNECTED_COLOR))
-            rad = 7
-        else:
-            painter.setBrush(QBrush(schemastyle.SOCKET_NEUTRAL_COLOR))
-            rad = 6
-        oldfont = painter.font()
-        font = QFont(oldfont)
-        font.setPixelSize(10)
-        painter.setFont(font)
-        if self.sockLocation == SocketGI.LEFT:
-            painter.drawEllipse(QPoint(self.sockHeight // 2, 0), rad, rad)
-            textrect = QRectF(self.sockHeight, -self.sockHeight // 2, self.sockWidth - self.sockHeight, self.sockHeight)
-            painter.setPen(schemastyle.SOCKET_NAME_COLOR)
-            painter.drawText(textrect, Qt.AlignLeft | Qt.AlignVCenter, self.sockName)
-        else:
-            painter.drawEllipse(QPoint(-self.sockHeight // 2, 0), rad, rad)
-            textrect = QRectF(-self.sockWidth, -self.sockHeight // 2, self.sockWidth - self.sockHeight, self.sockHeight)
-            painter.setPen(schemastyle.SOCKET_NAME_COLOR)
-            painter.drawText(textrect, Qt.AlignRight | Qt.AlignVCenter, self.sockName)
-
-        # restore font
-        painter.setFont(oldfont)
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        paintSocket(painter, lod, self.sockLocation, self.sockName, self.hovering)
 
     def onSockConn(self, pos):
-        if self.sockLocation == SocketGI.LEFT:
-            return pos.x() < self.sockHeight
-        else:
-            return pos.x() > -self.sockHeight
+        return onConnectionPoint(self.sockLocation, pos.x())
 
     def hoverMoveEvent(self, event):
-        if self.onSockConn(event.pos()):
-            self.hovering = True
-            self.setCursor(Qt.CrossCursor)
-        else:
-            self.hovering = False
-            self.setCursor(Qt.ArrowCursor)
-        self.update()
+        # Only repaints when moving onto or off the connection point
+        hovering = self.onSockConn(event.pos())
+        self.hoverState.setTarget(hovering)
+        self.hoverState.setCursor(Qt.CrossCursor if hovering else Qt.ArrowCursor)
 
     def mousePressEvent(self, event):
         if self.onSockConn(event.pos()) and self.link == None:
@@ -95,9 +198,9 @@ class SocketGI(QGraphicsItem):
                 self.scene().startConnecting(self)
 
     def hoverLeaveEvent(self, event):
-        self.setCursor(Qt.ArrowCursor)
-        self.hovering = False
-        super().hoverLeaveEvent(event)
+        self.hoverState.setCursor(Qt.ArrowCursor)
+        # Not calling super(), the hover tracker repaints already
+        self.hoverState.setTarget(False)
 
     def linkConnectionPos(self):
         if self.sockLocation == SocketGI.LEFT:
@@ -0,0 +1,319 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Spatial indices of the items in the scene
+
+GridIndex is a uniform grid index of points. Every point is stored in the
+square cell of the grid that contains it, so finding the points near a
+position only looks at the few cells around it instead of at every item in
+the scene.
+
+RectIndex is a uniform grid index of rectangles, for objects like links that
+cover an area instead of a point.
+
+BoundsIndex keeps the bounding rectangle of a set of rectangles up to date
+while they are added, moved and removed, without walking all of them.
+
+author: Rinse Wester
+
+"""
+
+import math
+import heapq
+import itertools
+
+
+class GridIndex(object):
+    """
+    Spatial index of objects located at a point.
+
+    Parameters
+    ----------
+    cellSize : width and height of a grid cell. Queries are fastest when the
+        search radius is about the size of a cell.
+    """
+
+    def __init__(self, cellSize):
+        self.cellSize = cellSize
+        self.cells = {}
+        # position and cell of every object
+        self.points = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __contains__(self, obj):
+        return obj in self.points
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cellSize)), int(math.floor(y / self.cellSize))
+
+    def insert(self, obj, x, y):
+        """
+        Adds obj at (x, y), or moves it there when it is in the index already.
+        """
+        cell = self._cell(x, y)
+        old = self.points.get(obj)
+        if old is not None and old[2] != cell:
+            self._removeFromCell(obj, old[2])
+            old = None
+        self.points[obj] = (x, y, cell)
+        if old is None:
+            self.cells.setdefault(cell, set()).add(obj)
+
+    move = insert
+
+    def remove(self, obj):
+        """
+        Removes obj from the index, nothing happens when it is not present.
+        """
+        old = self.points.pop(obj, None)
+        if old is not None:
+            self._removeFromCell(obj, old[2])
+
+    def clear(self):
+        self.cells.clear()
+        self.points.clear()
+
+    def position(self, obj):
+        x, y, _ = self.points[obj]
+        return x, y
+
+    def within(self, x, y, radius):
+        """
+        Returns (distance, obj) tuples of all objects within radius of (x, y),
+        nearest first.
+        """
+        found = []
+        r2 = radius * radius
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for obj in self.cells.get((cx, cy), ()):
+                    ox, oy, _ = self.points[obj]
+                    d2 = (ox - x) ** 2 + (oy - y) ** 2
+                    if d2 <= r2:
+                        found.append((math.sqrt(d2), obj))
+        found.sort(key=lambda f: f[0])
+        return found
+
+    def inRect(self, left, top, right, bottom):
+        """
+        Returns all objects with their point in the rectangle.
+        """
+        found = []
+        cx0, cy0 = self._cell(left, top)
+        cx1, cy1 = self._cell(right, bottom)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Cheaper to look at the occupied cells only
+            cells = [(cell, objs) for cell, objs in self.cells.items()
+                if cx0 <= cell[0] <= cx1 and cy0 <= cell[1] <= cy1]
+        else:
+            cells = [(cell, self.cells[cell]) for cell in
+                ((cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)) if cell in self.cells]
+        for _, objs in cells:
+            for obj in objs:
+                ox, oy, _ = self.points[obj]
+                if left <= ox <= right and top <= oy <= bottom:
+                    found.append(obj)
+        return found
+
+    def nearest(self, x, y, radius, accept=None):
+        """
+        Returns the object nearest to (x, y) within radius, or None.
+
+        Parameters
+        ----------
+        accept : optional predicate, objects for which it returns False are
+            skipped
+        """
+        for _, obj in self.within(x, y, radius):
+            if accept is None or accept(obj):
+                return obj
+        return None
+
+    def _removeFromCell(self, obj, cell):
+        objs = self.cells[cell]
+        objs.discard(obj)
+        if not objs:
+            del self.cells[cell]
+
+
+class RectIndex(object):
+    """
+    Spatial index of objects covering a rectangle.
+
+    Every object is stored in all grid cells its rectangle overlaps. Objects
+    that overlap more than MAX_CELLS cells are kept apart and checked by every
+    query, so a few very large objects do not fill the grid.
+
+    Parameters
+    ----------
+    cellSize : width and height of a grid cell
+    """
+
+    MAX_CELLS = 64
+
+    def __init__(self, cellSize):
+        self.cellSize = cellSize
+        self.cells = {}
+        self.large = set()
+        # rectangle and range of cells of every object, the range is None for
+        # the large objects
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, obj):
+        return obj in self.rects
+
+    def _cellRange(self, left, top, right, bottom):
+        size = self.cellSize
+        return (int(math.floor(left / size)), int(math.floor(top / size)),
+            int(math.floor(right / size)), int(math.floor(bottom / size)))
+
+    def insert(self, obj, left, top, right, bottom):
+        """
+        Adds the rectangle of obj, or moves it when it is in the index already.
+        """
+        self.remove(obj)
+        cells = self._cellRange(left, top, right, bottom)
+        cx0, cy0, cx1, cy1 = cells
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > RectIndex.MAX_CELLS:
+            self.large.add(obj)
+            cells = None
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self.cells.setdefault((cx, cy), set()).add(obj)
+        self.rects[obj] = (left, top, right, bottom, cells)
+
+    move = insert
+
+    def remove(self, obj):
+        """
+        Removes obj from the index, nothing happens when it is not present.
+        """
+        old = self.rects.pop(obj, None)
+        if old is None:
+            return
+        cells = old[4]
+        if cells is None:
+            self.large.discard(obj)
+            return
+        cx0, cy0, cx1, cy1 = cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                objs = self.cells[(cx, cy)]
+                objs.discard(obj)
+                if not objs:
+                    del self.cells[(cx, cy)]
+
+    def clear(self):
+        self.cells.clear()
+        self.large.clear()
+        self.rects.clear()
+
+    def inRect(self, left, top, right, bottom):
+        """
+        Returns all objects of which the rectangle overlaps the given one.
+        """
+        cx0, cy0, cx1, cy1 = self._cellRange(left, top, right, bottom)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Cheaper to look at the occupied cells only
+            cells = [objs for cell, objs in self.cells.items()
+                if cx0 <= cell[0] <= cx1 and cy0 <= cell[1] <= cy1]
+        else:
+            cells = [self.cells[cell] for cell in
+                ((cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)) if cell in self.cells]
+        cells.append(self.large)
+
+        found = set()
+        for objs in cells:
+            for obj in objs:
+                if obj not in found:
+                    oleft, otop, oright, obottom, _ = self.rects[obj]
+                    if oleft <= right and left <= oright and otop <= bottom and top <= obottom:
+                        found.add(obj)
+        return found
+
+
+class BoundsIndex(object):
+    """
+    Bounding rectangle of a changing set of rectangles.
+
+    Every side of the bounding rectangle is the top of a heap of the sides
+    of the rectangles. Moving or removing a rectangle leaves its old entries
+    in the heaps; they are dropped when they reach the top. Updates and
+    queries therefore take O(log n) amortized time.
+    """
+
+    def __init__(self):
+        # left, top, right, bottom of every object
+        self.rects = {}
+        # Heaps of (side, token, obj) with the right and bottom sides negated
+        # so all four keep their extreme value at the top. An entry is only
+        # valid while token is the current token of obj.
+        self.heaps = ([], [], [], [])
+        self.tokens = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, obj):
+        return obj in self.rects
+
+    def insert(self, obj, left, top, right, bottom):
+        """
+        Adds the rectangle of obj, or moves it when it is in the index already.
+        """
+        token = next(self.counter)
+        self.tokens[obj] = token
+        self.rects[obj] = (left, top, right, bottom)
+        for heap, side in zip(self.heaps, (left, top, -right, -bottom)):
+            heapq.heappush(heap, (side, token, obj))
+        if len(self.heaps[0]) > 2 * len(self.rects) + 64:
+            self._compact()
+
+    move = insert
+
+    def remove(self, obj):
+        """
+        Removes obj from the index, nothing happens when it is not present.
+        """
+        if self.rects.pop(obj, None) is not None:
+            del self.tokens[obj]
+
+    def clear(self):
+        self.rects.clear()
+        self.tokens.clear()
+        for heap in self.heaps:
+            heap.clear()
+
+    def bounds(self):
+        """
+        Returns (left, top, right, bottom) of all rectangles, or None when
+        the index is empty.
+        """
+        if not self.rects:
+            return None
+        sides = []
+        for heap in self.heaps:
+            while heap[0][1] != self.tokens.get(heap[0][2]):
+                heapq.heappop(heap)
+            sides.append(heap[0][0])
+        left, top, right, bottom = sides
+        return left, top, -right, -bottom
+
+    def _compact(self):
+        # Drop all invalid entries
+        for heap in self.heaps:
+            heap[:] = [(side, token, obj) for side, token, obj in heap if self.tokens.get(obj) == token]
+            heapq.heapify(heap)